@@ -0,0 +1,383 @@
+'''
+Benchmark suite for timeWarpOB, timing the warp functions over a range of series
+lengths (100 to 100k), warp methods, windows, input types and backends.  The
+time taken by the first call (including numba compilation) is measured
+separately from the steady state time of later calls.
+
+To run, use the following at a Command Prompt, from the top folder of the
+package::
+
+	python -m tests.benchmark --output results.json
+
+To check for regressions, compare against the results of an earlier run (e.g.
+on the same machine, before a change)::
+
+	python -m tests.benchmark --baseline baseline.json --threshold 0.25
+
+The run fails (exit status 1) if any result is more than ``threshold`` (a
+fraction, so 0.25 = 25%) slower than the baseline.
+'''
+
+# Define python imports
+from __future__ import division, print_function
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# Series lengths of the full and quick (--quick) suites
+SIZES = [100, 1000, 10000, 100000]
+QUICK_SIZES = [100, 1000]
+
+# Warp windows (0 = no window)
+WINDOWS = [0, 10, 100]
+
+# Largest series for which the full n x n matrices are calculated, and largest
+# number of cells in the warp window of a single warp
+DENSE_LENGTH = 2000
+BAND_CELLS = 2 * 10 ** 8
+
+# Entry points timed for their first call (compilation), each in a new process
+COMPILE_CASES = ['timeWarp/DTW', 'timeWarp/ERP', 'timeWarp/cost', 'L1distances', 'DTWwarp', 'ERPwarp', 'backTrace']
+
+
+def benchmarkCases(sizes=SIZES):
+	'''Lists the steady state benchmark cases.
+
+	Parameters
+	----------
+		sizes : list
+			Series lengths to benchmark
+
+	Returns
+	-------
+		cases : list
+			List of case dicts, with the keys ``function``, ``method``, ``window``,
+			``input``, ``mode`` and ``n``
+	'''
+	cases = []
+
+	for n in sizes:
+		for method in ['DTW', 'ERP']:
+			for window in WINDOWS:
+				if window >= n:
+					continue
+
+				cells = n * n
+				if window != 0:
+					cells = n * (2 * window - 1)
+
+				# full = matrices and path, path = path only, cost = cost only
+				for mode in ['full', 'path', 'cost']:
+					if cells > BAND_CELLS or (mode == 'full' and n > DENSE_LENGTH):
+						continue
+
+					for inputType in ['ndarray', 'list']:
+						cases.append({"function": "timeWarp", "method": method, "window": window,
+							"input": inputType, "mode": mode, "n": n})
+
+		# The functions working on full matrices
+		if n <= DENSE_LENGTH:
+			cases.append({"function": "L1distances", "method": "", "window": 0, "input": "ndarray", "mode": "full", "n": n})
+			for window in WINDOWS:
+				if window < n:
+					cases.append({"function": "DTWwarp", "method": "DTW", "window": window, "input": "ndarray", "mode": "full", "n": n})
+					cases.append({"function": "ERPwarp", "method": "ERP", "window": window, "input": "ndarray", "mode": "full", "n": n})
+			cases.append({"function": "backTrace", "method": "DTW", "window": 0, "input": "ndarray", "mode": "full", "n": n})
+
+	return cases
+
+
+def caseName(case):
+	'''Name of a benchmark case, as used in the results.
+	'''
+	return "/".join([case["function"], case["method"], "w=" + str(case["window"]), case["input"],
+		case["mode"], "n=" + str(case["n"])])
+
+
+def _series(n):
+	'''Two noisy sine waves of length n, one a quarter of a cycle behind the other.
+	'''
+	rng = np.random.RandomState(0)
+	ts = np.linspace(0, 20*np.pi, n)
+
+	a = np.sin(ts) + rng.normal(scale=0.1, size=n)
+	b = np.cos(ts) + rng.normal(scale=0.1, size=n)
+
+	return a, b
+
+
+def _caseCall(case,n):
+	'''Prepares the inputs of a benchmark case for series of length n, and returns
+	a function which runs it.
+	'''
+	import timeWarpOB as tw
+
+	a, b = _series(n)
+	window = case["window"]
+	if window >= n:
+		window = 0
+
+	if case["function"] == "timeWarp":
+		if case["input"] == "list":
+			a = list(a)
+			b = list(b)
+
+		retMat = case["mode"] == "full"
+		retPath = case["mode"] != "cost"
+
+		def call():
+			wo = tw.timeWarp(a,b,method=case["method"],window=window,retMat=retMat,
+				retPath=retPath,ERPg=0.1)
+
+			# The results are only converted to lists when they are read
+			if case["input"] == "list":
+				for key in ["backTracePath", "costMat", "distMat"]:
+					if key in wo:
+						wo[key]
+
+			return wo
+
+		return call
+
+	if case["function"] == "L1distances":
+		return lambda: tw.L1distances(a,b)
+
+	dist = tw.L1distances(a,b)
+
+	if case["function"] == "DTWwarp":
+		return lambda: tw.DTWwarp(dist,a,b,window)
+
+	if case["function"] == "ERPwarp":
+		return lambda: tw.ERPwarp(dist,a,b,window,0.1)
+
+	costMat = np.asarray(tw.DTWwarp(dist,a,b,window))
+
+	return lambda: tw.backTrace(costMat,dist)
+
+
+def timeCase(case,budget=1.0,repeats=5):
+	'''Times the steady state of a benchmark case.  The case is first run on short
+	series, so that compilation is not included, then repeated (up to repeats
+	times, or until budget seconds have been used) on series of length n.
+
+	Returns
+	-------
+		seconds : float
+			Fastest time of the repeats
+	'''
+	_caseCall(case,50)()
+
+	call = _caseCall(case,case["n"])
+
+	times = []
+	while len(times) < repeats and (len(times) == 0 or sum(times) < budget):
+		t0 = time.perf_counter()
+		call()
+		times.append(time.perf_counter() - t0)
+
+	return min(times)
+
+
+def timeCompile(name):
+	'''Times the first call of an entry point on short series (including numba
+	compilation), in a process which has not called it before.
+
+	Returns
+	-------
+		seconds : float
+			Time of the first call
+	'''
+	function = name.split("/")[0]
+	method = "DTW"
+	mode = "path"
+	if name == "timeWarp/ERP" or function == "ERPwarp":
+		method = "ERP"
+	if name == "timeWarp/cost":
+		mode = "cost"
+
+	case = {"function": function, "method": method, "window": 0, "input": "ndarray", "mode": mode, "n": 50}
+	call = _caseCall(case,50)
+
+	t0 = time.perf_counter()
+	call()
+
+	return time.perf_counter() - t0
+
+
+def _worker(args):
+	'''Runs the benchmarks of one backend (set by the parent process) and prints
+	the results as JSON.
+	'''
+	results = {}
+
+	if args.worker == "steady":
+		sizes = QUICK_SIZES if args.quick else SIZES
+		for case in benchmarkCases(sizes):
+			results[caseName(case)] = timeCase(case,args.budget)
+	else:
+		results[args.worker] = timeCompile(args.worker)
+
+	print(json.dumps(results))
+
+
+def _runWorker(backend,worker,args):
+	'''Runs the benchmarks in a new process with the backend chosen.
+	'''
+	env = dict(os.environ)
+	env["TIMEWARPOB_BACKEND"] = backend
+
+	command = [sys.executable, "-m", "tests.benchmark", "--worker", worker, "--budget", str(args.budget)]
+	if args.quick:
+		command.append("--quick")
+
+	here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	out = subprocess.run(command, env=env, cwd=here, stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+
+	# Any warnings are printed before the results
+	return json.loads(out.strip().splitlines()[-1])
+
+
+def runBenchmarks(backends,quick=False,compileTimes=True,budget=1.0):
+	'''Runs the benchmark suite, with each backend in its own process.
+
+	Parameters
+	----------
+		backends : list
+			Backends to benchmark ``{'numba','numpy'}``
+		quick : bool
+			Only benchmark series of up to 1000 periods (default = False)
+		compileTimes : bool
+			Whether to time the first calls (default = True)
+		budget : float
+			Time in seconds to spend repeating each case (default = 1)
+
+	Returns
+	-------
+		report : dict
+			The ``meta`` data of the run (versions and machine) and the
+			``results``, in seconds by ``backend/compile/case`` and
+			``backend/steady/case``
+	'''
+	args = argparse.Namespace(quick=quick, budget=budget)
+	results = {}
+
+	for backend in backends:
+		if compileTimes:
+			for name in COMPILE_CASES:
+				for key, seconds in _runWorker(backend,name,args).items():
+					results[backend + "/compile/" + key] = seconds
+
+		for key, seconds in _runWorker(backend,"steady",args).items():
+			results[backend + "/steady/" + key] = seconds
+
+	meta = {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+		"processor": platform.processor(), "cpus": os.cpu_count(), "quick": quick,
+		"time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+	try:
+		import numba
+		meta["numba"] = numba.__version__
+	except ImportError:
+		meta["numba"] = None
+
+	return {"meta": meta, "results": results}
+
+
+def compareResults(results,baseline,threshold=0.25,minTime=0.001):
+	'''Compares benchmark results against a baseline.
+
+	Parameters
+	----------
+		results, baseline : dict
+			Benchmark results, by case name (the ``results`` of ``runBenchmarks()``)
+		threshold : float
+			Largest allowed slowdown, as a fraction of the baseline time (default =
+			0.25)
+		minTime : float
+			Cases faster than this many seconds in both runs are not compared, as
+			their timings are mostly noise (default = 0.001)
+
+	Returns
+	-------
+		regressions : list
+			List of (case, baseline seconds, seconds, ratio) tuples for the cases
+			which are slower than allowed, slowest first
+	'''
+	regressions = []
+
+	for key in sorted(results):
+		if key not in baseline:
+			continue
+
+		old = baseline[key]
+		new = results[key]
+		if max(old, new) < minTime:
+			continue
+
+		ratio = new / max(old, 1e-12)
+		if ratio > 1 + threshold:
+			regressions.append((key, old, new, ratio))
+
+	regressions.sort(key=lambda r: -r[3])
+
+	return regressions
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Benchmarks of timeWarpOB")
+	parser.add_argument("--output", help="file to write the results to (JSON)")
+	parser.add_argument("--baseline", help="results of an earlier run to compare against (JSON)")
+	parser.add_argument("--threshold", type=float, default=0.25, help="largest allowed slowdown against the baseline, as a fraction (default 0.25)")
+	parser.add_argument("--min-time", type=float, default=0.001, help="cases faster than this (seconds) are not compared (default 0.001)")
+	parser.add_argument("--backends", default=None, help="comma separated backends to run (default: numba (if installed) and numpy)")
+	parser.add_argument("--quick", action="store_true", help="only benchmark series of up to 1000 periods")
+	parser.add_argument("--no-compile", action="store_true", help="do not time the first calls")
+	parser.add_argument("--budget", type=float, default=1.0, help="seconds to spend repeating each case (default 1)")
+	parser.add_argument("--worker", help=argparse.SUPPRESS)
+	args = parser.parse_args(argv)
+
+	if args.worker is not None:
+		_worker(args)
+		return 0
+
+	if args.backends is None:
+		import importlib.util
+		backends = ["numpy"]
+		if importlib.util.find_spec("numba") is not None:
+			backends = ["numba", "numpy"]
+	else:
+		backends = args.backends.split(",")
+
+	report = runBenchmarks(backends,args.quick,not args.no_compile,args.budget)
+
+	for key in sorted(report["results"]):
+		print("%-70s %10.4f s" % (key, report["results"][key]))
+
+	if args.output is not None:
+		with open(args.output, "w") as f:
+			json.dump(report, f, indent=1, sort_keys=True)
+
+	if args.baseline is not None:
+		with open(args.baseline) as f:
+			baseline = json.load(f)["results"]
+
+		regressions = compareResults(report["results"],baseline,args.threshold,args.min_time)
+		if len(regressions) > 0:
+			print("\n%d results regressed by more than %g%%:" % (len(regressions), 100 * args.threshold))
+			for key, old, new, ratio in regressions:
+				print("%-70s %10.4f s -> %10.4f s (x%.2f)" % (key, old, new, ratio))
+			return 1
+
+		print("\nNo regressions against " + args.baseline)
+
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -1,6 +1,55 @@
 import numpy as np
 import timeWarpOB as tw
 import unittest
+import subprocess
+import sys
+import os
+import pickle
+
+
+def backendResults():
+	'''Warps a set of test series with the current backend, for comparing the
+	numba and numpy backends'''
+
+	rng = np.random.RandomState(6)
+	a = rng.normal(size=45)
+	b = rng.normal(size=45)
+	x = rng.normal(size=(30,2))
+	y = rng.normal(size=(30,2))
+
+	results = []
+	for method in ['DTW', 'ERP', 'FastDTW']:
+		for window in [0, 1, 6]:
+			wo = tw.timeWarp(a,b,method=method,window=window,ERPg=0.3)
+			results.append([wo["cost"], wo["costMat"], wo["distMat"], wo["backTracePath"],
+				wo["backTraceCost"], wo["warpStats"]])
+
+	for metric in ['L1', 'L2', 'chebyshev']:
+		wo = tw.timeWarp(x,y,window=5,metric=metric)
+		results.append([wo["cost"], wo["backTracePath"], wo["distMat"]])
+
+	wo = tw.timeWarp(x,y,method='ERP',multivariate='independent')
+	results.append([wo["channelCost"], wo["backTracePath"]])
+
+	wo = tw.timeWarp(a,b,constraint='itakura',retMat=False)
+	results.append([wo["cost"], wo["backTracePath"]])
+
+	dist = tw.L1distances(list(a),list(b))
+	costMat = tw.DTWwarp(dist,list(a),list(b),5)
+	results.append([dist, costMat, tw.ERPwarp(dist,list(a),list(b),0,0.2), tw.backTrace(costMat,dist)])
+
+	many = tw.timeWarpMany(a,[b,b[0:30]],window=4,retPath=True)
+	results.append([many["cost"], many["backTracePath"], tw.pairwiseWarp([a,b,a[0:20]])])
+
+	wo = tw.timeWarp(a.astype(np.float32),b.astype(np.float32),window=6,dtype=np.float32)
+	results.append([wo["cost"], wo["costMat"], wo["distMat"], wo["backTracePath"]])
+
+	c = (a * 20000).astype(np.int16)
+	wo = tw.timeWarp(c,-c,method='ERP',metric='sqeuclidean')
+	results.append([wo["cost"], wo["distMat"], wo["backTracePath"]])
+
+	return results
+
 
 class test_full(unittest.TestCase):
 	'''
@@ -102,6 +151,895 @@ class test_full(unittest.TestCase):
 			self.assertTrue(d[i][i] == 0)
 			self.assertTrue(e[i][i] == 0)
 
+	def testBandWindow(self):
+		'''Checks the banded warp gives the same cost matrix, path and 
+		statistics as the dense DTW and ERP calculations'''
+
+		ts = np.linspace(0, 4*np.pi, 300)
+		x = np.sin(ts)
+		y = np.cos(ts)
+		c = tw.L1distances(x,y)
+
+		for w in [0, 1, 10, 50]:
+			d = tw.DTWwarp(c,x,y,w=w)
+			e = tw.ERPwarp(c,x,y,w=w,g=0.5)
+
+			wo = tw.timeWarp(x,y,method='DTW',window=w)
+			self.assertTrue(np.array_equal(d, wo["costMat"]))
+			path, backTraceCost, warpStats = tw.backTrace(d,c)
+			self.assertTrue(np.array_equal(path, wo["backTracePath"]))
+			self.assertTrue(warpStats == wo["warpStats"])
+
+			wo = tw.timeWarp(x,y,method='ERP',window=w,ERPg=0.5)
+			self.assertTrue(np.array_equal(e, wo["costMat"]))
+			path, backTraceCost, warpStats = tw.backTrace(e,c)
+			self.assertTrue(np.array_equal(path, wo["backTracePath"]))
+
+	def testCostOnly(self):
+		'''Checks the rolling-row cost matches the full cost matrix, and 
+		that no path is calculated'''
+
+		ts = np.linspace(0, 4*np.pi, 300)
+		x = np.sin(ts)
+		y = np.cos(ts * 1.1)
+
+		for w in [0, 1, 10, 50]:
+			for method in ['DTW', 'ERP']:
+				full = tw.timeWarp(x,y,method=method,window=w,ERPg=0.5)
+				wo = tw.timeWarp(x,y,method=method,window=w,ERPg=0.5,retMat=False,retPath=False)
+
+				self.assertTrue(wo["cost"] == full["cost"])
+				self.assertFalse("backTracePath" in wo)
+				self.assertFalse("costMat" in wo)
+
+	def testFusedDistances(self):
+		'''Checks the backtrace cost is the same whether or not the distance 
+		matrix is built'''
+
+		ts = np.linspace(0, 4*np.pi, 300)
+		x = np.sin(ts)
+		y = np.cos(ts)
+
+		for w in [0, 10]:
+			full = tw.timeWarp(x,y,window=w)
+			wo = tw.timeWarp(x,y,window=w,retMat=False)
+
+			self.assertFalse("distMat" in wo)
+			self.assertTrue(np.array_equal(full["distMat"], tw.L1distances(x,y)))
+			self.assertTrue(wo["backTraceCost"] == full["backTraceCost"])
+			self.assertTrue(np.array_equal(wo["backTracePath"], full["backTracePath"]))
+
+	def testBackTraceDirections(self):
+		'''Checks the backtrace along the recorded directions matches the 
+		backtrace through the full cost matrix'''
+
+		ts = np.linspace(0, 4*np.pi, 300)
+		x = np.sin(ts)
+		y = np.cos(ts * 1.1)
+		c = tw.L1distances(x,y)
+
+		for w in [0, 10]:
+			lo, hi = tw.warpLimits(300,300,w)
+			start = tw.bandOffsets(lo,hi)
+			cost, costBand, dirBand = tw.warpBand(x,y,lo,hi,start,True,0.5,False)
+			path, backTraceCost, warpStats = tw.backTraceBand(dirBand,x,y,lo,hi,start)
+
+			e = tw.ERPwarp(c,x,y,w=w,g=0.5)
+			ePath, eCost, eStats = tw.backTrace(e.tolist(),c.tolist())
+
+			self.assertTrue(path.dtype == np.int32)
+			self.assertTrue(len(path) <= 2*300 - 1)
+			self.assertTrue(cost == e[-1,-1])
+			self.assertTrue(np.array_equal(path, ePath))
+			self.assertTrue(backTraceCost == eCost)
+			self.assertTrue(warpStats == eStats)
+
+	def testFastDTW(self):
+		'''Checks FastDTW never beats the exact DTW cost, and matches it when
+		the radius covers the whole cost matrix'''
+
+		ts = np.linspace(0, 4*np.pi, 500)
+		x = np.sin(ts)
+		y = np.cos(ts * 1.1)
+
+		wo = tw.timeWarp(x,y,method='DTW',retMat=False)
+
+		for r in [0, 1, 5]:
+			fo = tw.timeWarp(x,y,method='FastDTW',radius=r,retMat=False)
+			self.assertTrue(fo["cost"] >= wo["cost"])
+			self.assertAlmostEqual(fo["backTraceCost"], fo["cost"])
+			self.assertTrue(np.array_equal(fo["backTracePath"][0], [499,499]))
+			self.assertTrue(np.array_equal(fo["backTracePath"][-1], [0,0]))
+
+		fo = tw.timeWarp(x,y,method='FastDTW',radius=500)
+		self.assertTrue(fo["cost"] == wo["cost"])
+		self.assertTrue(fo["warpStats"] == wo["warpStats"])
+
+	def testNearestNeighbours(self):
+		'''Checks the lower-bound search finds the same nearest references as
+		warping against every reference'''
+
+		rng = np.random.RandomState(0)
+		refs = np.cumsum(rng.normal(size=(300,64)), axis=1)
+		query = refs[17] + rng.normal(scale=0.3, size=64)
+
+		for w in [0, 5]:
+			costs = [tw.timeWarp(query,r,window=w,retMat=False,retPath=False)["cost"] for r in refs]
+			expected = np.argsort(costs, kind='stable')[0:3]
+
+			result = tw.search.nearestNeighbours(query,refs,k=3,window=w)
+			self.assertTrue(np.array_equal(result["index"], expected))
+			self.assertTrue(np.allclose(result["cost"], np.array(costs)[expected]))
+
+			pruned = result["pruned"]["LB_Kim"] + result["pruned"]["LB_Keogh"]
+			self.assertTrue(pruned + result["warped"] == len(refs))
+			self.assertTrue(result["warped"] < len(refs))
+
+	def testWarpMany(self):
+		'''Checks warping against many references in one call gives the same
+		results as warping against each in turn'''
+
+		rng = np.random.RandomState(1)
+		query = rng.normal(size=100)
+		refs = [rng.normal(size=l) for l in [80, 100, 120, 1]]
+
+		for method in ['DTW', 'ERP']:
+			many = tw.timeWarpMany(query,refs,method=method,window=7,ERPg=0.2,retPath=True)
+			costs = tw.timeWarpMany(query,refs,method=method,window=7,ERPg=0.2)["cost"]
+
+			for r in range(len(refs)):
+				wo = tw.timeWarp(query,refs[r],method=method,window=7,ERPg=0.2,retMat=False)
+				self.assertTrue(costs[r] == wo["cost"])
+				self.assertTrue(many["cost"][r] == wo["cost"])
+				self.assertTrue(np.array_equal(many["backTracePath"][r], wo["backTracePath"]))
+				self.assertTrue(many["warpStats"][r] == wo["warpStats"])
+
+		costs = tw.timeWarpMany(query,np.array(refs[0:1]))["cost"]
+		self.assertTrue(costs[0] == tw.timeWarp(query,refs[0])["cost"])
+
+	def testPairwise(self):
+		'''Checks the condensed pairwise cost matrix matches warping each pair
+		in turn'''
+
+		rng = np.random.RandomState(2)
+		series = [rng.normal(size=l) for l in [50, 60, 40, 50, 55, 45, 50]]
+
+		for method in ['DTW', 'ERP']:
+			costs = tw.pairwiseWarp(series,method=method,window=5,ERPg=0.1)
+			self.assertTrue(len(costs) == 7*6/2)
+
+			p = 0
+			for i in range(7):
+				for j in range(i+1, 7):
+					wo = tw.timeWarp(series[i],series[j],method=method,window=5,ERPg=0.1)
+					self.assertAlmostEqual(costs[p], wo["cost"])
+					p += 1
+
+		for N in [2, 3, 10, 201]:
+			pairs = [tw.timeWarpOB._condensedPair(p,N) for p in range(N*(N-1)//2)]
+			self.assertTrue(pairs == [(i,j) for i in range(N) for j in range(i+1,N)])
+
+	def testStreamMatcher(self):
+		'''Checks the streaming matcher finds two warped copies of a template 
+		in noise, with the DTW cost of the matched part of the stream'''
+
+		rng = np.random.RandomState(3)
+		template = 3 * np.sin(np.linspace(0, 2*np.pi, 40))
+		stream = rng.normal(scale=0.2, size=1000)
+		stream[200:250] += 3 * np.sin(np.linspace(0, 2*np.pi, 50))
+		stream[600:635] += 3 * np.sin(np.linspace(0, 2*np.pi, 35))
+
+		sm = tw.streaming.StreamMatcher(template,15)
+		matches = []
+		for x in stream[0:500]:
+			matches += sm.update(x)
+		matches += sm.update(stream[500:])
+		matches += sm.flush()
+
+		self.assertTrue(len(matches) == 2)
+		self.assertTrue(abs(matches[0][0] - 200) < 5 and abs(matches[0][1] - 249) < 5)
+		self.assertTrue(abs(matches[1][0] - 600) < 5 and abs(matches[1][1] - 634) < 5)
+
+		for start, end, cost in matches:
+			sub = stream[start:end+1]
+			d = tw.DTWwarp(tw.L1distances(sub,template),sub,template)
+			self.assertAlmostEqual(d[-1,-1], cost)
+
+		# Integer streams have many paths of equal cost, which must not start 
+		# inside a match that has already been reported
+		rng = np.random.RandomState(16)
+		for trial in range(40):
+			template = rng.randint(0,3,size=4).astype(float)
+			stream = rng.randint(0,3,size=60).astype(float)
+			sm = tw.streaming.StreamMatcher(template,2)
+
+			for start, end, cost in sm.update(stream) + sm.flush():
+				sub = stream[start:end+1]
+				d = tw.DTWwarp(tw.L1distances(sub,template),sub,template)
+				self.assertTrue(d[-1,-1] == cost)
+
+	def testIncrementalWarp(self):
+		'''Checks the incremental cost matches recalculating the whole cost 
+		matrix as samples are added to both series'''
+
+		rng = np.random.RandomState(4)
+		a = rng.normal(size=120)
+		b = rng.normal(size=100)
+
+		for method in ['DTW', 'ERP']:
+			for w in [0, 5, 30]:
+				iw = tw.streaming.IncrementalWarp(a[0:10],method=method,window=w,ERPg=0.3)
+				na = 10
+				nb = 0
+
+				while na < 120 or nb < 100:
+					ka = rng.randint(0,9)
+					kb = rng.randint(0,9)
+					iw.extend(a[na:na+ka], b[nb:nb+kb])
+					na = min(120, na + ka)
+					nb = min(100, nb + kb)
+
+					if nb > 0:
+						c = tw.L1distances(a[0:na],b[0:nb])
+						if method == 'DTW':
+							d = tw.DTWwarp(c,a[0:na],b[0:nb],w=w)
+						else:
+							d = tw.ERPwarp(c,a[0:na],b[0:nb],w=w,g=0.3)
+						self.assertTrue(iw.cost == d[-1,-1])
+
+				if w != 5:
+					path, backTraceCost, warpStats = iw.path()
+					self.assertTrue(np.array_equal(path, tw.backTrace(d,c)[0]))
+
+		# No path if a series is empty, or the window does not reach the end
+		self.assertRaises(ValueError, tw.streaming.IncrementalWarp().path)
+		self.assertRaises(ValueError, tw.streaming.IncrementalWarp(a[0:10]).path)
+
+		iw = tw.streaming.IncrementalWarp(a[0:20],b[0:15],window=5)
+		self.assertTrue(iw.cost == np.inf)
+		self.assertRaises(ValueError, iw.path)
+
+	def testConstraints(self):
+		'''Checks the Itakura parallelogram and custom constraints keep the warp
+		path inside the allowed region, matching a masked cost matrix'''
+
+		rng = np.random.RandomState(5)
+		x = rng.normal(size=150)
+		y = rng.normal(size=150)
+		c = tw.L1distances(x,y)
+
+		lo, hi = tw.itakuraLimits(150,150)
+		self.assertTrue(tw.checkLimits(lo,hi,150) is None)
+
+		# A custom constraint allowing a diagonal strip of width 3
+		rows = np.arange(150)
+		strip = (np.maximum(rows - 1, 0), np.minimum(rows + 1, 149))
+
+		for constraint, (cLo, cHi) in [('itakura', (lo, hi)), (strip, strip)]:
+			wo = tw.timeWarp(x,y,constraint=constraint)
+
+			# Cost matrix calculated over the whole matrix, then masked
+			d = np.full((150,150), np.inf)
+			for i in range(150):
+				for j in range(cLo[i], cHi[i]+1):
+					if i == 0 and j == 0:
+						d[i,j] = c[i,j]
+					else:
+						d[i,j] = c[i,j] + min(d[i-1,j-1] if i > 0 and j > 0 else np.inf,
+							d[i-1,j] if i > 0 else np.inf, d[i,j-1] if j > 0 else np.inf)
+
+			self.assertTrue(np.array_equal(d, wo["costMat"]))
+			for i, j in wo["backTracePath"]:
+				self.assertTrue(cLo[i] <= j <= cHi[i])
+
+		self.assertTrue(tw.timeWarp(x,y,constraint=(hi,lo)) == -1)
+		self.assertTrue(tw.timeWarp(x,y,constraint=(lo[0:100],hi[0:100])) == -1)
+		self.assertTrue(tw.timeWarp(x,y,constraint=(0,149)) == -1)
+
+	def testMultivariate(self):
+		'''Checks dependent warping of multichannel series matches DTW on the
+		summed channel distances, and independent warping matches warping each
+		channel in turn'''
+
+		rng = np.random.RandomState(4)
+		x = rng.normal(size=(60,3))
+		y = rng.normal(size=(60,3))
+
+		wo = tw.timeWarp(x,y,window=9)
+		dist = np.abs(x[:,None,:] - y[None,:,:]).sum(axis=2)
+		self.assertTrue(np.allclose(wo["distMat"], dist))
+
+		costMat = np.asarray(tw.DTWwarp(dist,list(x[:,0]),list(y[:,0]),9))
+		self.assertAlmostEqual(wo["cost"], costMat[-1,-1])
+		self.assertAlmostEqual(tw.timeWarp(x,y,window=9,retMat=False,retPath=False)["cost"], wo["cost"])
+
+		for method in ['DTW', 'ERP']:
+			ind = tw.timeWarp(x,y,method=method,window=9,ERPg=0.3,multivariate='independent')
+			self.assertAlmostEqual(ind["cost"], sum(ind["channelCost"]))
+
+			for c in range(3):
+				wo = tw.timeWarp(x[:,c],y[:,c],method=method,window=9,ERPg=0.3)
+				self.assertTrue(ind["channelCost"][c] == wo["cost"])
+				self.assertTrue(np.array_equal(ind["backTracePath"][c], wo["backTracePath"]))
+				self.assertTrue(ind["warpStats"][c] == wo["warpStats"])
+				self.assertTrue(np.array_equal(ind["costMat"][c], wo["costMat"]))
+
+		# A single channel warps the same as a 1D series
+		self.assertTrue(tw.timeWarp(x[:,0:1],y[:,0:1])["cost"] == tw.timeWarp(x[:,0],y[:,0])["cost"])
+		self.assertTrue(tw.timeWarp(x,y[:,0:2]) == -1)
+
+	def testMetrics(self):
+		'''Checks warping with each metric in the registry matches DTW on the
+		distance matrix of that metric, and a registered metric function is
+		compiled once'''
+
+		rng = np.random.RandomState(5)
+		x = rng.normal(size=(40,2))
+		y = rng.normal(size=(40,2))
+
+		diff = x[:,None,:] - y[None,:,:]
+		dists = {'L1': np.abs(diff).sum(axis=2),
+			'L2': np.sqrt((diff ** 2).sum(axis=2)),
+			'sqeuclidean': (diff ** 2).sum(axis=2),
+			'chebyshev': np.abs(diff).max(axis=2)}
+
+		for name in dists:
+			wo = tw.timeWarp(x,y,window=6,metric=name)
+			self.assertTrue(np.allclose(wo["distMat"], dists[name]))
+			self.assertTrue(np.allclose(tw.distances(x,y,name), dists[name]))
+
+			costMat = np.asarray(tw.DTWwarp(dists[name],list(x[:,0]),list(y[:,0]),6))
+			self.assertAlmostEqual(wo["cost"], costMat[-1,-1])
+			self.assertAlmostEqual(wo["backTraceCost"], wo["cost"])
+
+		def cubed(x,y,i,j):
+			return abs(x[i] - y[j]) ** 3
+
+		metric = tw.registerMetric('cubed',cubed)
+		self.assertTrue(tw.metrics['cubed'] is metric)
+
+		a = x[:,0]
+		b = y[:,0]
+		cost = tw.timeWarp(a,b,method='ERP',ERPg=0.2,metric='cubed',retMat=False)["cost"]
+		self.assertTrue(tw.timeWarp(a,b,method='ERP',ERPg=0.2,metric=cubed,retMat=False)["cost"] == cost)
+		self.assertTrue(tw.pairwiseWarp([a,b],metric='cubed')[0] == tw.timeWarp(a,b,metric='cubed')["cost"])
+
+		self.assertTrue(tw.timeWarp(x,y,metric='unknown') == -1)
+
+	def testImportTime(self):
+		'''Checks importing timeWarpOB is within the import time budget, and does
+		not load numba, matplotlib, the compiled functions or the tests until they
+		are used'''
+
+		budget = 0.1
+		code = ("import sys, time\n"
+			"t = time.perf_counter()\n"
+			"import timeWarpOB\n"
+			"t = time.perf_counter() - t\n"
+			"loaded = [m for m in ['numba', 'matplotlib', 'timeWarpOB.timeWarpOB', 'tests'] if m in sys.modules]\n"
+			"print(t, len(loaded))\n"
+			"from timeWarpOB import *\n"
+			"print(int(callable(timeWarp)))\n")
+
+		# Take the fastest of a few runs, to allow for a busy machine
+		root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+		times = []
+		for run in range(3):
+			out = subprocess.check_output([sys.executable, '-c', code], cwd=root, universal_newlines=True)
+			out = out.split()
+			times.append(float(out[0]))
+			self.assertTrue(out[1] == '0')
+			self.assertTrue(out[2] == '1')
+
+		self.assertTrue(min(times) < budget)
+
+	def testNumpyBackend(self):
+		'''Checks the vectorised numpy backend (used when numba is not installed)
+		gives the same results as the current backend'''
+
+		self.assertTrue(tw.backend in ['numba', 'numpy'])
+
+		root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+		env = dict(os.environ, TIMEWARPOB_BACKEND='numpy')
+		code = ("import pickle, sys, tests.full\n"
+			"import timeWarpOB as tw\n"
+			"pickle.dump([tw.backend, tests.full.backendResults()], sys.stdout.buffer)\n")
+
+		out = subprocess.check_output([sys.executable, '-c', code], cwd=root, env=env)
+		backend, results = pickle.loads(out)
+
+		self.assertTrue(backend == 'numpy')
+
+		def same(a, b):
+			if isinstance(a, (list, tuple)):
+				return len(a) == len(b) and all(same(u, v) for u, v in zip(a, b))
+			if isinstance(a, dict):
+				return a == b
+			return np.array_equal(a, b)
+
+		expected = backendResults()
+		for r in range(len(expected)):
+			self.assertTrue(same(results[r], expected[r]))
+
+	def testTiled(self):
+		'''Checks the tiled parallel cost matrix matches the cost matrix filled 
+		row by row, and DTWwarp'''
+
+		rng = np.random.RandomState(7)
+
+		for n, m, window, tile in [(7,7,0,3), (60,60,0,8), (100,90,9,16), (301,301,20,32), (120,200,0,64)]:
+			x = rng.normal(size=n)
+			y = rng.normal(size=m)
+			lo, hi = tw.warpLimits(n,m,window)
+			start = tw.bandOffsets(lo,hi)
+
+			for erp in [False, True]:
+				cost, costBand, dirBand = tw.warpBand(x,y,lo,hi,start,erp,0.3)
+				tiled = tw.warpTiled(x,y,lo,hi,start,erp,0.3,True,True,tw.metrics['L1'],tile)
+
+				self.assertTrue(tiled[0] == cost)
+				self.assertTrue(np.array_equal(tiled[1], costBand))
+				self.assertTrue(np.array_equal(tiled[2], dirBand))
+				self.assertTrue(tw.warpTiled(x,y,lo,hi,start,erp,0.3,False,False,tw.metrics['L1'],tile)[0] == cost)
+
+				if not erp:
+					costMat = np.asarray(tw.DTWwarp(tw.L1distances(x,y),x,y,window))
+					self.assertTrue(np.array_equal(tw.bandToDense(tiled[1],lo,hi,start,m), costMat))
+
+		# timeWarp uses the tiles for large bands
+		x = rng.normal(size=150)
+		y = rng.normal(size=150)
+		wo = tw.timeWarp(x,y,window=30)
+		cells = tw.timeWarpOB.TILED_CELLS
+		tw.timeWarpOB.TILED_CELLS = 100
+		try:
+			tiled = tw.timeWarp(x,y,window=30)
+			self.assertTrue(tw.timeWarp(x,y,window=30,retMat=False,retPath=False)["cost"] == wo["cost"])
+		finally:
+			tw.timeWarpOB.TILED_CELLS = cells
+
+		self.assertTrue(tiled["cost"] == wo["cost"])
+		self.assertTrue(np.array_equal(tiled["costMat"], wo["costMat"]))
+		self.assertTrue(np.array_equal(tiled["backTracePath"], wo["backTracePath"]))
+
+	def testPrecision(self):
+		'''Checks float32 cost matrices are float32 and close to float64, and that
+		integer series do not overflow'''
+
+		rng = np.random.RandomState(8)
+		a = rng.normal(size=80).astype(np.float32)
+		b = rng.normal(size=80).astype(np.float32)
+
+		for method in ['DTW', 'ERP']:
+			wo64 = tw.timeWarp(a,b,method=method,window=10)
+			wo32 = tw.timeWarp(a,b,method=method,window=10,dtype=np.float32)
+
+			self.assertTrue(wo32["costMat"].dtype == np.float32)
+			self.assertTrue(wo32["distMat"].dtype == np.float32)
+			self.assertTrue(wo64["costMat"].dtype == np.float64)
+			self.assertTrue(abs(wo32["cost"] - wo64["cost"]) < 1e-4 * wo64["cost"])
+			self.assertTrue(np.allclose(wo32["costMat"], wo64["costMat"], rtol=1e-5))
+
+		dist = tw.L1distances(a,b,np.float32)
+		self.assertTrue(dist.dtype == np.float32)
+		self.assertTrue(np.asarray(tw.DTWwarp(dist,a,b,5,np.float32)).dtype == np.float32)
+
+		self.assertTrue(tw.timeWarp(a,b,dtype='float16') == -1)
+
+		# Differences of int16 samples are larger than int16
+		x = np.array([32767, -32767, 100, -5, 32000, 0], dtype=np.int16)
+		y = np.array([-32767, 32767, 0, 7, -32000, 1], dtype=np.int16)
+		for method in ['DTW', 'ERP']:
+			for metric in ['L1', 'sqeuclidean', 'chebyshev']:
+				wo = tw.timeWarp(x,y,method=method,metric=metric)
+				ref = tw.timeWarp(x.astype(np.float64),y.astype(np.float64),method=method,metric=metric)
+
+				self.assertTrue(wo["cost"] == ref["cost"])
+				self.assertTrue(np.array_equal(wo["distMat"], ref["distMat"]))
+				self.assertTrue(np.array_equal(wo["backTracePath"], ref["backTracePath"]))
+
+	def testMemmap(self):
+		'''Checks cost and distance matrices written into memory-mapped files match
+		the matrices held in memory'''
+
+		import tempfile
+		import shutil
+		from timeWarpOB import plotting
+
+		rng = np.random.RandomState(9)
+		directory = tempfile.mkdtemp()
+		cells = tw.timeWarpOB.MAPPED_CELLS
+
+		try:
+			# Read the cost matrix back a few rows at a time
+			tw.timeWarpOB.MAPPED_CELLS = 64
+
+			for method, window, constraint in [('DTW',0,None), ('ERP',0,None), ('DTW',6,None), ('ERP',4,'itakura'), ('FastDTW',0,None)]:
+				a = rng.normal(size=70)
+				b = rng.normal(size=70)
+				ref = tw.timeWarp(a,b,method=method,window=window,constraint=constraint,ERPg=0.2)
+				wo = tw.timeWarp(a,b,method=method,window=window,constraint=constraint,ERPg=0.2,memmap=directory)
+
+				self.assertTrue(isinstance(wo["costMat"], np.memmap))
+				self.assertTrue(wo["cost"] == ref["cost"])
+				self.assertTrue(np.array_equal(wo["costMat"], ref["costMat"]))
+				self.assertTrue(np.array_equal(wo["distMat"], ref["distMat"]))
+				self.assertTrue(np.array_equal(wo["backTracePath"], ref["backTracePath"]))
+				self.assertTrue(wo["backTraceCost"] == ref["backTraceCost"])
+				self.assertTrue(wo["warpStats"] == ref["warpStats"])
+
+			# The files can be opened again, and backtraced without loading them
+			costMat = np.load(os.path.join(directory, 'costMat.npy'), mmap_mode='r')
+			dist = np.load(os.path.join(directory, 'distMat.npy'), mmap_mode='r')
+			self.assertTrue(np.array_equal(costMat, ref["costMat"]))
+
+			path, backTraceCost, warpStats = tw.backTrace(costMat,dist)
+			expected = tw.backTrace(np.array(costMat),np.array(dist))
+			self.assertTrue(np.array_equal(path, expected[0]))
+			self.assertTrue(warpStats == expected[2])
+
+			# Matrices supplied by the caller
+			shape = (60,60)
+			costMat = np.lib.format.open_memmap(os.path.join(directory, 'c.npy'), mode='w+', dtype=np.float32, shape=shape)
+			dist = np.lib.format.open_memmap(os.path.join(directory, 'd.npy'), mode='w+', dtype=np.float32, shape=shape)
+			a = list(rng.normal(size=60))
+			b = list(rng.normal(size=60))
+
+			wo = tw.timeWarp(a,b,dtype=np.float32,memmap=(costMat,dist))
+			ref = tw.timeWarp(a,b,dtype=np.float32)
+			self.assertTrue(wo["costMat"] is costMat)
+			self.assertTrue(np.array_equal(costMat, ref["costMat"]))
+			self.assertTrue(wo["backTracePath"] == ref["backTracePath"])
+
+			self.assertTrue(tw.timeWarp(a,b,memmap=(costMat,dist)) == -1)
+			self.assertTrue(tw.timeWarp(a[0:50],b[0:50],dtype=np.float32,memmap=(costMat,dist)) == -1)
+
+			self.assertTrue(plotting._displayMatrix(costMat,25).shape == (20,20))
+		finally:
+			tw.timeWarpOB.MAPPED_CELLS = cells
+			shutil.rmtree(directory)
+
+	def testWarpResult(self):
+		'''Checks the warp object can be read as attributes and dict keys, and that
+		lists are only built when they are read'''
+
+		a = list(np.sin(np.linspace(0, 3*np.pi, 60)))
+		b = list(np.cos(np.linspace(0, 3*np.pi, 60)))
+
+		wo = tw.timeWarp(a,b,window=10)
+		ref = tw.timeWarp(np.array(a),np.array(b),window=10)
+
+		self.assertTrue(isinstance(wo, tw.WarpResult))
+		# The keys are in the order of the dict returned by earlier versions
+		self.assertTrue(list(wo.keys()) == ['warpWindow', 'cost', 'backTraceCost', 'warpStats', 'backTracePath', 'costMat', 'distMat'])
+		self.assertTrue(wo.cost == wo["cost"] == ref["cost"])
+		self.assertTrue(wo.warpStats == wo["warpStats"] == ref["warpStats"])
+
+		# Nothing is converted until it is read, and then only once
+		self.assertTrue(type(wo._costMat) == np.ndarray)
+		self.assertTrue(len(wo) == 7 and "costMat" in wo and type(wo._costMat) == np.ndarray)
+		self.assertTrue(wo["costMat"] == ref["costMat"].tolist())
+		self.assertTrue(wo.costMat is wo["costMat"])
+		self.assertTrue(type(wo._distMat) == np.ndarray)
+		self.assertTrue(wo["backTracePath"] == ref["backTracePath"].tolist())
+		self.assertTrue(type(ref["costMat"]) == np.ndarray)
+
+		wo = tw.timeWarp(a,b,retMat=False)
+		self.assertTrue("costMat" not in wo and wo.get("costMat") is None)
+		self.assertRaises(KeyError, lambda: wo["costMat"])
+		self.assertRaises(KeyError, lambda: wo["keys"])
+		self.assertTrue(dict(wo)["backTracePath"] == wo.backTracePath)
+
+		wo["cost"] = 1
+		self.assertTrue(wo.cost == 1)
+
+		# Other keys can be added and removed, as with a dict
+		wo["label"] = "a"
+		self.assertTrue(wo["label"] == "a" and "label" in wo and list(wo.keys())[-1] == "label")
+		del wo["label"]
+		del wo["warpStats"]
+		self.assertTrue("label" not in wo and "warpStats" not in wo)
+		self.assertRaises(KeyError, lambda: wo["label"])
+
+		# Equal results compare equal, and can be changed like the old dict
+		wo = tw.timeWarp(a,b,window=10)
+		other = tw.timeWarp(a,b,window=10)
+		self.assertTrue(wo == other and wo == dict(other) and wo.copy() == other)
+		other.update(label="b")
+		self.assertTrue(wo != other and other.pop("label") == "b" and wo == other)
+		self.assertTrue(other.setdefault("cost", 1) == wo["cost"] and other.setdefault("label", "c") == "c")
+		self.assertTrue(list(other.keys())[-1] == "label")
+
+		x = np.random.RandomState(10).normal(size=(30,2))
+		wo = tw.timeWarp(x.tolist(),x.tolist(),multivariate='independent')
+		self.assertTrue(type(wo["costMat"][1]) == list and type(wo["backTracePath"][0]) == list)
+
+	def testLinearPath(self):
+		'''Checks the linear memory path recovery gives the same path and statistics
+		as the full backtrace, including between paths of equal cost'''
+
+		rng = np.random.RandomState(11)
+		cells = tw.timeWarpOB.LINEAR_CELLS
+
+		try:
+			# Split the cost matrix down to blocks of a few cells
+			for blockCells in [4, 50]:
+				tw.timeWarpOB.LINEAR_CELLS = blockCells
+
+				for n, window, constraint in [(1,0,None), (2,0,None), (37,0,None), (50,5,None), (61,0,'itakura'), (45,12,None)]:
+					series = [(rng.normal(size=n), rng.normal(size=n)),
+						(rng.randint(0,3,size=n), rng.randint(0,3,size=n)),
+						(rng.normal(size=(n,2)), rng.normal(size=(n,2)))]
+
+					for a, b in series:
+						for method in ['DTW', 'ERP']:
+							ref = tw.timeWarp(a,b,method=method,window=window,constraint=constraint,ERPg=0.5,retMat=False)
+							wo = tw.timeWarp(a,b,method=method,window=window,constraint=constraint,ERPg=0.5,retMat=False,linearPath=True)
+
+							self.assertTrue(wo["cost"] == ref["cost"])
+							self.assertTrue(np.array_equal(wo["backTracePath"], ref["backTracePath"]))
+							self.assertTrue(wo["backTraceCost"] == ref["backTraceCost"])
+							self.assertTrue(wo["warpStats"] == ref["warpStats"])
+
+			a = rng.normal(size=80).astype(np.float32)
+			b = rng.normal(size=80).astype(np.float32)
+			ref = tw.timeWarp(a,b,window=9,retMat=False,dtype=np.float32)
+			wo = tw.timeWarp(list(a),list(b),window=9,retMat=False,dtype=np.float32,linearPath=True)
+			self.assertTrue(wo["cost"] == ref["cost"])
+			self.assertTrue(wo["backTracePath"] == ref["backTracePath"].tolist())
+		finally:
+			tw.timeWarpOB.LINEAR_CELLS = cells
+
+	def testBenchmark(self):
+		'''Checks the benchmark cases run, and that regressions against a baseline
+		are reported'''
+
+		from tests import benchmark
+
+		cases = benchmark.benchmarkCases([100])
+		names = [benchmark.caseName(case) for case in cases]
+		self.assertTrue(len(set(names)) == len(names))
+		self.assertTrue("timeWarp/ERP/w=10/list/path/n=100" in names)
+		self.assertTrue("backTrace/DTW/w=0/ndarray/full/n=100" in names)
+
+		# Only windowed warps of the longest series
+		for case in benchmark.benchmarkCases([100000]):
+			self.assertTrue(case["window"] > 0 and case["mode"] != "full")
+
+		for case in cases:
+			if case["function"] != "timeWarp" or case["input"] == "list":
+				self.assertTrue(benchmark.timeCase(case,0,1) > 0)
+
+		baseline = {"a": 1.0, "b": 1.0, "c": 0.0001, "d": 2.0}
+		results = {"a": 1.2, "b": 1.5, "c": 0.0009, "d": 1.0, "e": 5.0}
+		regressions = benchmark.compareResults(results,baseline,0.25)
+		self.assertTrue([r[0] for r in regressions] == ["b"])
+		self.assertTrue([r[0] for r in benchmark.compareResults(results,baseline,0.1,0)] == ["c", "b", "a"])
+
+
+	def testProfile(self):
+		'''Checks the profile of the stages and work of a warp, through the result
+		and the hooks, and that profiling is off by default'''
+
+		rng = np.random.RandomState(12)
+		a = rng.normal(size=60)
+		b = rng.normal(size=60)
+
+		wo = tw.timeWarp(a,b,window=10)
+		self.assertTrue("profile" not in wo)
+
+		profiles = []
+		wo = tw.timeWarp(a,b,window=10,profile=profiles.append)
+		self.assertTrue(len(profiles) == 1 and profiles[0] is wo["profile"])
+		self.assertTrue(wo["profile"]["cellsEvaluated"] == 60 * 19 - 90)
+		self.assertTrue(wo["profile"]["cellsEvaluated"] + wo["profile"]["cellsPruned"] == 60 * 60)
+		self.assertTrue(wo["profile"]["peakBytes"] > 60 * 60 * 8)
+		for stage in ["distance", "recurrence", "backtrace", "tolist", "compile"]:
+			self.assertTrue(wo["profile"]["stages"][stage] >= 0)
+
+		# The same results as without profiling
+		ref = tw.timeWarp(a,b,window=10)
+		self.assertTrue(wo["cost"] == ref["cost"])
+		self.assertTrue(np.array_equal(wo["backTracePath"], ref["backTracePath"]))
+
+		# Lists are timed when they are read
+		wo = tw.timeWarp(list(a),list(b),profile=True)
+		self.assertTrue(wo["profile"]["stages"]["tolist"] == 0)
+		wo["costMat"]
+		self.assertTrue(wo["profile"]["stages"]["tolist"] > 0)
+
+		try:
+			tw.setProfileHook(profiles.append)
+			tw.timeWarp(a,b,retMat=False,retPath=False)
+			tw.timeWarp(np.c_[a,b],np.c_[b,a],multivariate='independent',retMat=False)
+			self.assertTrue(len(profiles) == 3)
+			self.assertTrue(profiles[2]["cellsEvaluated"] == 2 * 60 * 60)
+		finally:
+			tw.setProfileHook(None)
+
+		tw.timeWarp(a,b)
+		self.assertTrue(len(profiles) == 3)
+
+	def testUpperBound(self):
+		'''Checks warps are abandoned when they cost more than the upper bound, and
+		give the same results as without a bound otherwise'''
+
+		rng = np.random.RandomState(13)
+		tiled = tw.timeWarpOB.TILED_CELLS
+		tile = tw.timeWarpOB.TILE_SIZE
+
+		try:
+			for cells, size in [(tiled, tile), (100, tile), (100, 8)]:
+				tw.timeWarpOB.TILED_CELLS = cells
+				tw.timeWarpOB.TILE_SIZE = size
+
+				for a, b in [(rng.normal(size=80), rng.normal(size=80) + 1), (rng.randint(0,9,size=60).astype(np.int16), rng.randint(0,9,size=60).astype(np.int16))]:
+					for method in ['DTW', 'ERP']:
+						for retMat, retPath, linearPath in [(False,False,False), (False,True,False), (True,True,False), (False,True,True)]:
+							kwargs = dict(method=method,window=15,ERPg=0.5,retMat=retMat,retPath=retPath,linearPath=linearPath)
+							ref = tw.timeWarp(a,b,profile=True,**kwargs)
+							band = ref["profile"]["cellsEvaluated"]
+
+							# Only the cells calculated before stopping are counted
+							wo = tw.timeWarp(a,b,upperBound=ref["cost"] / 4,profile=True,**kwargs)
+							self.assertTrue(wo["abandoned"] == True)
+							self.assertTrue(wo["cost"] == np.inf)
+							self.assertTrue("backTracePath" not in wo and "costMat" not in wo)
+							self.assertTrue(0 < wo["profile"]["cellsEvaluated"] <= band)
+							# A single tile is calculated whole before it is checked
+							if cells == tiled or size < len(a) or linearPath:
+								self.assertTrue(wo["profile"]["cellsEvaluated"] < band)
+
+							wo = tw.timeWarp(a,b,upperBound=ref["cost"],profile=True,**kwargs)
+							self.assertTrue(wo["abandoned"] == False)
+							self.assertTrue(wo["profile"]["cellsEvaluated"] == band)
+							self.assertTrue(wo["cost"] == ref["cost"])
+							if retPath:
+								self.assertTrue(np.array_equal(wo["backTracePath"], ref["backTracePath"]))
+
+							self.assertTrue("abandoned" not in ref)
+			# A step series is warped straight down the diagonal, which passes 
+			# from the corner of one tile to the next without touching the edges 
+			# of the tiles in between
+			tw.timeWarpOB.TILE_SIZE = 8
+			a = np.zeros(60)
+			a[8:] = 1000
+			for kwargs in [dict(retMat=False,retPath=False), dict(retMat=False,retPath=True)]:
+				wo = tw.timeWarp(a,a.copy(),upperBound=1.0,**kwargs)
+				self.assertTrue(wo["abandoned"] == False and wo["cost"] == 0)
+		finally:
+			tw.timeWarpOB.TILED_CELLS = tiled
+			tw.timeWarpOB.TILE_SIZE = tile
+
+		# Tiles of a single cell, with the bound at the cost
+		for i in range(20):
+			a = rng.normal(size=17)
+			b = rng.normal(size=17)
+			lo, hi = tw.timeWarpOB.warpLimits(17,17,5)
+			start = tw.timeWarpOB.bandOffsets(lo,hi)
+			cost = tw.timeWarpOB.warpCost(a,b,lo,hi)
+			self.assertTrue(tw.timeWarpOB.warpTiled(a,b,lo,hi,start,False,0,False,False,tw.timeWarpOB._L1,1,np.float64,cost)[0] == cost)
+
+		# Memory-mapped matrices are filled only up to the rows which cross the bound
+		import tempfile
+		import shutil
+
+		a = rng.normal(size=60)
+		b = rng.normal(size=60) + 1
+		directory = tempfile.mkdtemp()
+
+		try:
+			ref = tw.timeWarp(a,b,window=10,memmap=directory)
+			wo = tw.timeWarp(a,b,window=10,memmap=directory,upperBound=ref["cost"] / 4,profile=True)
+			self.assertTrue(wo["abandoned"] == True and wo["cost"] == np.inf)
+			self.assertTrue("backTracePath" not in wo)
+			self.assertTrue(wo["profile"]["cellsEvaluated"] < 60 * 21 - 110)
+
+			wo = tw.timeWarp(a,b,window=10,memmap=directory,upperBound=ref["cost"])
+			self.assertTrue(wo["abandoned"] == False and wo["cost"] == ref["cost"])
+			self.assertTrue(np.array_equal(wo["backTracePath"], ref["backTracePath"]))
+		finally:
+			shutil.rmtree(directory)
+
+		a = rng.normal(size=50)
+		b = rng.normal(size=50) + 2
+		dist = tw.L1distances(a,b)
+		ref = tw.DTWwarp(dist,a,b,5)
+		costMat = tw.DTWwarp(dist,a,b,5,np.float64,ref[-1,-1] / 10)
+		self.assertTrue(costMat[-1,-1] == np.inf)
+		self.assertTrue(np.array_equal(tw.DTWwarp(dist,a,b,5,np.float64,ref[-1,-1]), ref))
+		self.assertTrue(tw.ERPwarp(dist,a,b,0,0.5,np.float64,1)[-1,-1] == np.inf)
+
+		self.assertTrue(tw.timeWarp(np.c_[a,b],np.c_[b,a],multivariate='independent',upperBound=1) == -1)
+
+		# The search results are not changed by abandoning references
+		from timeWarpOB import search
+		refs = rng.normal(size=(200,40)).cumsum(axis=1)
+		query = refs[7] + rng.normal(scale=0.1,size=40)
+		result = search.nearestNeighbours(query,refs,k=3,window=6)
+		costs = [tw.timeWarp(query,r,window=6,retMat=False,retPath=False)["cost"] for r in refs]
+		self.assertTrue(np.array_equal(result["index"], np.argsort(costs, kind='stable')[0:3]))
+		self.assertTrue(result["abandoned"] > 0)
+
+	def testDBA(self):
+		'''Checks DTW Barycenter Averaging against an iteration written out with
+		timeWarp(), and that the cost falls until it converges'''
+
+		from timeWarpOB import averaging
+
+		rng = np.random.RandomState(14)
+		ts = np.linspace(0, 2*np.pi, 40)
+		series = np.array([np.sin(ts * (1 + 0.1 * rng.normal()) + 0.3 * rng.normal()) for s in range(12)])
+
+		# One iteration, from the mean of the series
+		result = averaging.dbaAverage(series,window=8,maxIter=1,tol=0)
+		average = series.mean(axis=0)
+		sums = np.zeros(40)
+		counts = np.zeros(40)
+		for s in series:
+			wo = tw.timeWarp(average,s,window=8,retMat=False,metric='sqeuclidean')
+			for i, j in wo["backTracePath"]:
+				sums[i] += s[j]
+				counts[i] += 1
+		self.assertTrue(np.allclose(result["average"], sums / counts))
+		self.assertTrue(result["iterations"] == 1)
+
+		result = averaging.dbaAverage(series,window=8,maxIter=50)
+		self.assertTrue(result["converged"] == True)
+		self.assertTrue(result["iterations"] < 50)
+		self.assertTrue(np.all(np.diff(result["costs"])[:-1] < 0))
+		self.assertTrue(result["cost"] == result["costs"].min())
+		self.assertTrue(result["cost"] < result["costs"][0])
+
+		# The average of copies of one series is the series
+		result = averaging.dbaAverage([series[0]] * 3)
+		self.assertTrue(np.allclose(result["average"], series[0]))
+		self.assertTrue(result["cost"] < 1e-12)
+
+		self.assertRaises(ValueError, averaging.dbaAverage, [[1.0, 2.0], [1.0]])
+		self.assertRaises(ValueError, averaging.dbaAverage, series, init=[1.0, 2.0])
+
+	def testReferenceIndex(self):
+		'''Checks a saved reference library opens memory-mapped, and searches the 
+		same as the library it was saved from'''
+
+		import tempfile
+		import shutil
+
+		rng = np.random.RandomState(15)
+		refs = np.cumsum(rng.normal(size=(200,50)), axis=1)
+		query = 2 * refs[31] + 1 + rng.normal(scale=0.1, size=50)
+		directory = tempfile.mkdtemp()
+
+		try:
+			for normalise in [False, True]:
+				library = tw.search.ReferenceLibrary(refs,window=5,normalise=normalise)
+				library.save(directory,{"labels": list(range(200))})
+
+				for mmap in [True, False]:
+					loaded = tw.search.ReferenceLibrary.load(directory,mmap)
+					self.assertTrue(isinstance(loaded.references, np.memmap) == mmap)
+					self.assertTrue(loaded.window == 5 and loaded.normalise == normalise and len(loaded) == 200)
+					self.assertTrue(loaded.metadata["labels"][7] == 7)
+					for name in tw.search.ReferenceLibrary.arrays:
+						self.assertTrue(np.array_equal(getattr(loaded,name), getattr(library,name)))
+
+					expected = library.search(query,k=3)
+					result = loaded.search(query,k=3)
+					self.assertTrue(np.array_equal(result["index"], expected["index"]))
+					self.assertTrue(np.array_equal(result["cost"], expected["cost"]))
+
+				# Only a scaled copy of reference 31 is close in shape
+				self.assertTrue((result["index"][0] == 31) == normalise)
+
+			normalised = tw.search.zNormalise(refs)
+			self.assertTrue(np.allclose(normalised.mean(axis=1), 0) and np.allclose(normalised.std(axis=1), 1))
+			self.assertTrue(np.array_equal(tw.search.zNormalise(np.ones(5)), np.zeros(5)))
+
+			os.remove(os.path.join(directory, 'index.json'))
+			self.assertRaises(ValueError, tw.search.ReferenceLibrary.load, directory)
+		finally:
+			shutil.rmtree(directory)
 
 if __name__ == '__main__':
     unittest.main()
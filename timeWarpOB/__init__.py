@@ -8,15 +8,57 @@ Oliver Binns
 
 # Define python imports
 from __future__ import division, print_function
+import importlib
 
-# Define timeWarp imports
-from .timeWarpOB import *
-from . import plotting
-import tests
+# The main module (which imports numba and compiles the time warping
+# functions), the submodules and the tests are only loaded when they are
+# first used, so importing timeWarpOB is fast.  Use timeWarpOB.timeWarp, etc.
+# as before.
+_submodules = ['averaging', 'plotting', 'search', 'streaming']
 
 # Define colours for display
 _col0 = '\033[0m'
 _col1 = '\033[95m'
 _col2 = '\033[92m'
 
-# Any startup code here
\ No newline at end of file
+
+def _loadMain():
+	'''Imports the main module, and copies its functions into the package (as
+	``from .timeWarpOB import *``).
+	'''
+	main = importlib.import_module('.timeWarpOB', __name__)
+
+	names = [name for name in vars(main) if not name.startswith('_')]
+	for name in names:
+		globals()[name] = getattr(main, name)
+
+	return names
+
+
+def __getattr__(name):
+	'''Loads the main module, a submodule or the tests the first time one of
+	their names is used.
+	'''
+	if name in _submodules:
+		return importlib.import_module('.' + name, __name__)
+
+	if name == 'tests':
+		return importlib.import_module('tests')
+
+	if name == '__all__':
+		return _loadMain() + _submodules
+
+	if name.startswith('__'):
+		raise AttributeError("module 'timeWarpOB' has no attribute '" + name + "'")
+
+	_loadMain()
+	if name in globals():
+		return globals()[name]
+
+	raise AttributeError("module 'timeWarpOB' has no attribute '" + name + "'")
+
+
+def __dir__():
+	return sorted(set(list(globals()) + _loadMain() + _submodules))
+
+# Any startup code here
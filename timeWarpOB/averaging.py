@@ -0,0 +1,111 @@
+# Using numpy for matrix manipulations
+import numpy as np
+
+from .timeWarpOB import _getMetric, _warpManyPaths
+
+
+def dbaAverage(series,window=0,maxIter=30,tol=1e-5,init=None,metric='sqeuclidean'):
+	'''Finds the average of a set of time series under DTW, using DTW Barycenter
+	Averaging (DBA), e.g. to build a template for a class of series.  In each
+	iteration, every series is warped against the current average (in parallel
+	across processor cores), and each point of the average is moved to the mean
+	of the points of the series that are warped onto it.
+
+	Parameters
+	----------
+		series : list or numpy 2D-array
+			The time series to average.  All series must be of the same length.
+		window : int
+			Time warping window constraint (default = 0)
+		maxIter : int
+			Largest number of iterations (default = 30)
+		tol : float
+			Stop once an iteration lowers the total DTW cost by less than this
+			fraction of the cost (default = 1e-5)
+		init : list or numpy 1D-array
+			Starting average (default = None, the mean of the series)
+		metric : str or function
+			Distance metric - see ``timeWarp()`` (default = 'sqeuclidean')
+
+	Returns
+	-------
+		result : dict
+			An averaging result object, containing the following items:
+		result.average : numpy 1D-array
+			The average series, of the same length as the series
+		result.cost : float
+			Total DTW cost of warping each series against the average
+		result.costs : numpy 1D-array
+			Total DTW cost of the average at the start of each iteration
+		result.iterations : int
+			Number of iterations used
+		result.converged : bool
+			Whether the cost stopped falling by more than ``tol`` before ``maxIter``
+			iterations
+
+	Notes
+	-----
+	* The mean of the warped points is the best average for the squared distance, so the total cost can only fall from one iteration to the next with ``metric = 'sqeuclidean'``.  With other metrics the average with the lowest cost found is returned.
+	'''
+	data = np.ascontiguousarray(series, dtype=np.float64)
+
+	if data.ndim != 2:
+		raise ValueError("dbaAverage error - series must all be of the same length")
+
+	metricName = metric
+	metric = _getMetric(metric)
+	if metric is None:
+		raise ValueError("dbaAverage error - incorrect metric specified: " + str(metricName))
+
+	N, n = data.shape
+
+	if init is None:
+		average = data.mean(axis=0)
+	else:
+		average = np.array(init, dtype=np.float64)
+		if average.shape != (n,):
+			raise ValueError("dbaAverage error - init must be the same length as the series")
+
+	refs = data.ravel()
+	offsets = np.arange(N + 1, dtype=np.int64) * n
+
+	best = average
+	bestCost = np.inf
+	costs = []
+	converged = False
+
+	for it in range(maxIter + 1):
+		# Warp every series against the average, with the paths in one array
+		cost, backTraceCost, paths, pathOffsets, counters = _warpManyPaths(average,refs,offsets,window,False,0,metric)
+
+		total = cost.sum()
+		costs.append(total)
+
+		if total < bestCost:
+			# Stop once the cost stops falling
+			converged = total == 0 or bestCost - total <= tol * total
+			best = average
+			bestCost = total
+		else:
+			converged = True
+
+		if converged or it == maxIter:
+			break
+
+		# Mean of the points warped onto each point of the average
+		owner = np.repeat(np.arange(N), np.diff(pathOffsets))
+		values = refs[offsets[owner] + paths[:,1]]
+
+		sums = np.bincount(paths[:,0], weights=values, minlength=n)
+		counts = np.bincount(paths[:,0], minlength=n)
+
+		average = sums / counts
+
+	result = {}
+	result["average"] = best
+	result["cost"] = bestCost
+	result["costs"] = np.array(costs)
+	result["iterations"] = len(costs) - 1
+	result["converged"] = converged
+
+	return result
@@ -11,7 +11,9 @@ def plotWarp(a,b,warpObj, ts=[]):
 			Second time series (reference)
 		warpObj : dict
 			A timeWarpOB warp object - see output of ``timeWarpOB.timeWarp()``.
-			NB: the object must contain the calclauted cost matrix (i.e. ``retMat = True``)
+			NB: the object must contain the calclauted cost matrix (i.e. ``retMat = True``).
+			Large (e.g. memory-mapped) cost matrices are shown at a reduced resolution,
+			so only part of the matrix is read.
 		ts : list
 			Optional list of timestamps for displaying on the graphs. If no timestamps are 
 			given, each time period will be given an incremented number, staring at 1.
@@ -43,7 +45,9 @@ def plotWarp(a,b,warpObj, ts=[]):
 	# Main warp path plot (centre)
 	plt.subplot2grid(gridSize, (2,1), rowspan=2, colspan=2)
 
-	plt.imshow(costMat, interpolation='nearest', cmap='Greys',aspect='auto') 
+	image = _displayMatrix(costMat)
+	plt.imshow(image, interpolation='nearest', cmap='Greys',aspect='auto',
+		extent=(-0.5, len(costMat[0]) - 0.5, n - 0.5, -0.5))
 	plt.autoscale(False)
 	plt.gca().invert_yaxis()
 	plt.xlabel("b")
@@ -141,4 +145,19 @@ def plotSeries(a,b,warpObj):
 	plt.legend();
 	for [map_x, map_y] in path:
 		plt.plot([map_x, map_y], [a[map_x], b[map_y]], 'r')
-	plt.show(block=False)
\ No newline at end of file
+	plt.show(block=False)
+
+
+def _displayMatrix(costMat,size=1000):
+	'''Reduces a large cost matrix to around size x size cells for display, by 
+	taking every k-th row and column.  Only the rows shown are read from a 
+	memory-mapped matrix.
+	'''
+	import numpy as np
+
+	if type(costMat) == list:
+		return costMat
+
+	step = max(1, -(-max(costMat.shape) // size))
+
+	return np.asarray(costMat[::step, ::step])
@@ -0,0 +1,399 @@
+# Using numpy for matrix manipulations
+import numpy as np
+import heapq
+import json
+import os
+
+from .timeWarpOB import jit, warpLimits, warpCost
+
+
+class ReferenceLibrary(object):
+	'''A library of reference time series, for finding the closest references
+	to a query series by DTW.  The lower bound envelopes of the references are
+	calculated once, when the library is created.
+
+	Candidates are first checked against the LB_Kim lower bound (the distance
+	between the first and last points), then the LB_Keogh lower bound (the
+	distance of the query from the envelope of the reference within the warp
+	window).  The exact DTW cost is only calculated for references which could
+	still be closer than the current k-th best match, and is abandoned as soon
+	as it is higher than the k-th best cost.
+
+	A library can be saved to a directory with ``save()``, and opened again with
+	``ReferenceLibrary.load()`` without recalculating the envelopes.
+
+	Parameters
+	----------
+		references : list or numpy 2D-array
+			The reference time series.  All references must be of the same length.
+		window : int
+			Time warping window constraint (default = 0)
+		normalise : bool
+			Z-normalise the references, and each query when it is searched for, so
+			that series are compared by shape only (default = False)
+	'''
+
+	# Arrays stored in a saved library, one .npy file each
+	arrays = ('references', 'upper', 'lower', 'ends', 'mean', 'std')
+
+	# Version of the saved library layout
+	version = 1
+
+	def __init__(self,references,window=0,normalise=False):
+		self.references = np.ascontiguousarray(references, dtype=np.float64)
+
+		if self.references.ndim != 2:
+			raise ValueError("ReferenceLibrary error - references must all be of the same length")
+
+		self.window = window
+		self.normalise = normalise
+		self.metadata = {}
+
+		# Mean and standard deviation of each reference before normalising
+		self.mean = self.references.mean(axis=1)
+		self.std = self.references.std(axis=1)
+		if normalise:
+			self.references = zNormalise(self.references)
+
+		n = self.references.shape[1]
+		self.lo, self.hi = warpLimits(n,n,window)
+
+		self.upper = np.empty_like(self.references)
+		self.lower = np.empty_like(self.references)
+		for r in range(len(self.references)):
+			self.upper[r], self.lower[r] = keoghEnvelope(self.references[r],window)
+
+		# The first and last points, which are all LB_Kim uses, stored together so
+		# that a mapped library only reads them from one place
+		self.ends = np.ascontiguousarray(self.references[:,[0,-1]])
+
+	def __len__(self):
+		return len(self.references)
+
+	def save(self,directory,metadata=None):
+		'''Saves the library to a directory, with one .npy file for each of the
+		references, their envelopes, first and last points and normalisation, and
+		the settings in index.json.
+
+		Parameters
+		----------
+			directory : str
+				Directory to save the library in (created if it does not exist)
+			metadata : dict
+				Any other information to store with the library, e.g. the labels of
+				the references (must be JSON serialisable, default = None, the 
+				library's ``metadata``)
+		'''
+		if metadata is None:
+			metadata = self.metadata
+
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+
+		for name in self.arrays:
+			np.save(os.path.join(directory, name + '.npy'), np.asarray(getattr(self,name)))
+
+		index = {"version": self.version, "window": int(self.window), "normalise": bool(self.normalise),
+			"count": len(self.references), "length": int(self.references.shape[1]), "metadata": metadata}
+
+		# Written last, so a partly written library cannot be opened
+		with open(os.path.join(directory, 'index.json'), 'w') as f:
+			json.dump(index, f, indent=1)
+
+	@classmethod
+	def load(cls,directory,mmap=True):
+		'''Opens a library saved with ``save()``.
+
+		Parameters
+		----------
+			directory : str
+				Directory the library was saved in
+			mmap : bool
+				Memory-map the arrays rather than reading them into memory, so that 
+				the library opens straight away and processes searching the same 
+				library share its memory (default = True)
+
+		Returns
+		-------
+			library : ReferenceLibrary
+				The library, with the arrays as read-only ``np.memmap`` arrays if 
+				``mmap = True``
+		'''
+		path = os.path.join(directory, 'index.json')
+		if not os.path.isfile(path):
+			raise ValueError("ReferenceLibrary error - no saved library in " + str(directory))
+
+		with open(path) as f:
+			index = json.load(f)
+
+		if index.get("version") != cls.version:
+			raise ValueError("ReferenceLibrary error - unknown library version: " + str(index.get("version")))
+
+		library = cls.__new__(cls)
+		library.window = index["window"]
+		library.normalise = index["normalise"]
+		library.metadata = index["metadata"]
+
+		for name in cls.arrays:
+			setattr(library, name, np.load(os.path.join(directory, name + '.npy'), mmap_mode='r' if mmap else None))
+
+		if library.references.shape != (index["count"], index["length"]):
+			raise ValueError("ReferenceLibrary error - references do not match index.json: " + str(library.references.shape))
+
+		n = index["length"]
+		library.lo, library.hi = warpLimits(n,n,library.window)
+
+		return library
+
+	def search(self,query,k=1):
+		'''Finds the k references with the lowest DTW cost to a query series.
+
+		Parameters
+		----------
+			query : list or numpy 1D-array
+				Time series to search for.  Must be the same length as the references.
+			k : int
+				Number of nearest references to return (default = 1)
+
+		Returns
+		-------
+			result : dict
+				A search result object, containing the following items:
+			result.index : numpy 1D-array
+				Indices of the k nearest references, closest first
+			result.cost : numpy 1D-array
+				DTW cost of each of the k nearest references (as
+				``timeWarp(query, reference, window=window)["cost"]``, with both 
+				z-normalised if ``normalise = True``)
+			result.pruned : dict
+				Number of references ruled out by each lower bound, with keys
+				``'LB_Kim'`` and ``'LB_Keogh'``
+			result.warped : int
+				Number of references for which the DTW cost was calculated
+			result.abandoned : int
+				Number of the warped references whose DTW calculation was stopped
+				early, for costing more than the k-th best match
+		'''
+		query = np.ascontiguousarray(query, dtype=np.float64)
+
+		if len(query) != self.references.shape[1]:
+			raise ValueError("ReferenceLibrary error - query must be the same length as the references")
+
+		if self.normalise:
+			query = zNormalise(query)
+
+		k = min(k, len(self.references))
+
+		# Check the cheapest bound first, and visit the most promising references
+		# first so the k-th best cost falls quickly
+		kim = lbKim(query, self.ends)
+		order = np.argsort(kim, kind='stable')
+
+		best = []
+		prunedKim = 0
+		prunedKeogh = 0
+		warped = 0
+		abandoned = 0
+
+		for c in range(len(order)):
+			r = order[c]
+			bestCost = np.inf
+			if len(best) == k:
+				bestCost = -best[0][0]
+
+			if kim[r] >= bestCost:
+				# All of the remaining references have a higher LB_Kim
+				prunedKim += len(order) - c
+				break
+
+			if lbKeogh(query, self.upper[r], self.lower[r]) >= bestCost:
+				prunedKeogh += 1
+				continue
+
+			cost = warpCost(query, self.references[r], self.lo, self.hi, ub=bestCost)
+			warped += 1
+
+			if cost == np.inf and bestCost < np.inf:
+				abandoned += 1
+				continue
+
+			if cost < bestCost:
+				if len(best) == k:
+					heapq.heapreplace(best, (-cost, -r))
+				else:
+					heapq.heappush(best, (-cost, -r))
+
+		best = sorted((-c, -r) for c, r in best)
+
+		result = {}
+		result["index"] = np.array([r for c, r in best], dtype=np.int64)
+		result["cost"] = np.array([c for c, r in best])
+		result["pruned"] = {"LB_Kim": prunedKim, "LB_Keogh": prunedKeogh}
+		result["warped"] = warped
+		result["abandoned"] = abandoned
+
+		return result
+
+
+def nearestNeighbours(query,references,k=1,window=0):
+	'''Finds the k references with the lowest DTW cost to a query series, using
+	lower bounds to avoid calculating the full DTW cost where possible.  To search
+	the same references many times, create a ``ReferenceLibrary`` once instead.
+
+	Parameters
+	----------
+		query : list or numpy 1D-array
+			Time series to search for
+		references : list or numpy 2D-array
+			The reference time series, all of the same length as the query
+		k : int
+			Number of nearest references to return (default = 1)
+		window : int
+			Time warping window constraint (default = 0)
+
+	Returns
+	-------
+		result : dict
+			A search result object - see ``ReferenceLibrary.search()``
+	'''
+	return ReferenceLibrary(references,window).search(query,k)
+
+
+def zNormalise(series):
+	'''Z-normalises a time series, or each row of a 2D-array of series, to a mean
+	of 0 and a standard deviation of 1.  Constant series are only shifted to a 
+	mean of 0.
+
+	Parameters
+	----------
+		series : numpy 1D or 2D-array
+			Time series, one per row
+
+	Returns
+	-------
+		normalised : numpy 1D or 2D-array
+			The normalised series
+	'''
+	mean = series.mean(axis=-1, keepdims=True)
+	std = series.std(axis=-1, keepdims=True)
+	std[std == 0] = 1
+
+	return (series - mean) / std
+
+
+def lbKim(query,references):
+	'''Calculates the LB_Kim lower bound of the DTW cost, which is the distance
+	between the first points plus the distance between the last points (as both
+	are on every warp path).
+
+	Parameters
+	----------
+		query : numpy 1D-array
+			Time series to search for
+		references : numpy 2D-array
+			The reference time series, one per row (or only their first and last
+			points)
+
+	Returns
+	-------
+		bound : numpy 1D-array
+			The lower bound for each reference
+	'''
+	bound = np.abs(references[:,0] - query[0])
+
+	if len(query) > 1:
+		bound += np.abs(references[:,-1] - query[-1])
+
+	return bound
+
+
+@jit
+def keoghEnvelope(c,w=0):
+	'''Calculates the upper and lower envelope of a time series within the warp
+	window, for the LB_Keogh lower bound.  Uses a running maximum and minimum, so
+	the time taken does not depend on the window size.
+
+	Parameters
+	----------
+		c : numpy 1D-array
+			Reference time series
+		w : int
+			Time warping window constraint (default = 0)
+
+	Returns
+	-------
+		upper : numpy 1D-array
+			Maximum of the reference within the warp window of each point
+		lower : numpy 1D-array
+			Minimum of the reference within the warp window of each point
+	'''
+	n = len(c)
+	reach = n
+	if w != 0:
+		reach = w - 1
+
+	upper = np.empty(n)
+	lower = np.empty(n)
+
+	# Queues of indices with decreasing (maxQ) and increasing (minQ) values
+	maxQ = np.empty(n, dtype=np.int64)
+	minQ = np.empty(n, dtype=np.int64)
+	maxHead = 0
+	maxTail = 0
+	minHead = 0
+	minTail = 0
+
+	nxt = 0
+	for i in range(n):
+		# Add the points entering the window
+		while nxt < n and nxt <= i + reach:
+			while maxTail > maxHead and c[maxQ[maxTail-1]] <= c[nxt]:
+				maxTail -= 1
+			maxQ[maxTail] = nxt
+			maxTail += 1
+
+			while minTail > minHead and c[minQ[minTail-1]] >= c[nxt]:
+				minTail -= 1
+			minQ[minTail] = nxt
+			minTail += 1
+
+			nxt += 1
+
+		# Drop the points leaving the window
+		while maxQ[maxHead] < i - reach:
+			maxHead += 1
+		while minQ[minHead] < i - reach:
+			minHead += 1
+
+		upper[i] = c[maxQ[maxHead]]
+		lower[i] = c[minQ[minHead]]
+
+	return upper, lower
+
+
+@jit
+def lbKeogh(query,upper,lower):
+	'''Calculates the LB_Keogh lower bound of the DTW cost, which is the distance
+	of the query from the envelope of a reference.
+
+	Parameters
+	----------
+		query : numpy 1D-array
+			Time series to search for
+		upper, lower : numpy 1D-array
+			The envelope of the reference (see ``keoghEnvelope()``)
+
+	Returns
+	-------
+		bound : float
+			The lower bound
+	'''
+	bound = 0.0
+
+	for i in range(len(query)):
+		if query[i] > upper[i]:
+			bound += query[i] - upper[i]
+		elif query[i] < lower[i]:
+			bound += lower[i] - query[i]
+
+	return bound
@@ -0,0 +1,408 @@
+# Using numpy for matrix manipulations
+import numpy as np
+
+from .timeWarpOB import jit, warpLimits, bandOffsets, warpBand, backTraceBand, _warpCell, _gapPoint, _L1
+
+
+class StreamMatcher(object):
+	'''Finds occurrences of a template pattern in a live stream of samples, using
+	the SPRING subsequence DTW method.  Only one column of the DTW cost matrix is
+	kept, so each new sample takes time and memory proportional to the length of
+	the template, however long the stream runs.
+
+	A match is reported once no later sample could extend it into a better
+	match, so there is a short delay between the end of a match and its report.
+
+	Parameters
+	----------
+		template : list or numpy 1D-array
+			The pattern to look for
+		threshold : float
+			Highest DTW cost between the template and a part of the stream which is
+			reported as a match
+	'''
+
+	def __init__(self,template,threshold):
+		self.template = np.ascontiguousarray(template, dtype=np.float64)
+		self.threshold = threshold
+		self.reset()
+
+	def reset(self):
+		'''Clears the stream, ready to start again from sample 0.
+		'''
+		m = len(self.template)
+
+		# DTW column of the cost matrix and the stream index each path started at
+		self.cost = np.full(m + 1, np.inf)
+		self.cost[0] = 0
+		self.start = np.zeros(m + 1, dtype=np.int64)
+
+		# Best match not yet reported: [cost] and [start, end]
+		self.best = np.array([np.inf])
+		self.span = np.zeros(2, dtype=np.int64)
+
+		self.t = 0
+
+	def update(self,samples):
+		'''Adds one or more samples to the stream.
+
+		Parameters
+		----------
+			samples : float, list or numpy 1D-array
+				The new samples
+
+		Returns
+		-------
+			matches : list
+				List of (start, end, cost) tuples for each match that has been
+				completed.  Start and end are the indices of the first and last
+				samples of the match in the stream.
+		'''
+		samples = np.ascontiguousarray(np.atleast_1d(samples), dtype=np.float64)
+
+		starts, ends, costs, self.t = springUpdate(samples,self.template,self.threshold,
+			self.cost,self.start,self.best,self.span,self.t)
+
+		return list(zip(starts.tolist(), ends.tolist(), costs.tolist()))
+
+	def flush(self):
+		'''Reports the best match so far, without waiting to see if later samples
+		would improve it (e.g. at the end of the stream).
+
+		Returns
+		-------
+			matches : list
+				List containing the (start, end, cost) tuple of the best match so
+				far, or an empty list if there is none.
+		'''
+		if self.best[0] > self.threshold:
+			return []
+
+		match = (int(self.span[0]), int(self.span[1]), float(self.best[0]))
+
+		# Matches may not overlap the reported match
+		self.cost[1:][self.start[1:] <= self.span[1]] = np.inf
+		self.best[0] = np.inf
+
+		return [match]
+
+
+class IncrementalWarp(object):
+	'''Warps two time series which grow over time.  The last row and last column 
+	of the cost matrix are kept, so when samples are added to either series only
+	the new rows and columns of the cost matrix are calculated.  Adding k samples
+	takes time proportional to k x n (or k x w with a warp window), rather than 
+	recalculating the whole matrix.
+
+	Parameters
+	----------
+		a : list or numpy 1D-array
+			Initial samples of the first time series (optional)
+		b : list or numpy 1D-array
+			Initial samples of the second time series (reference, optional)
+		method : str
+			Time warping method ``{'DTW','ERP'}``
+		window : int
+			Time warping window constraint (default = 0)
+		ERPg :	int
+			g-value (for ``method = 'ERP'`` only)
+
+	Notes
+	-----
+	* Unlike ``timeWarp()``, the series are not clipped to the same length.  The cost is the bottom left value of the n x m cost matrix.
+	'''
+
+	def __init__(self,a=None,b=None,method='DTW',window=0,ERPg=0):
+		if method != 'DTW' and method != 'ERP':
+			raise ValueError("IncrementalWarp error - incorrect warp method specified: " + str(method))
+
+		self.erp = method == 'ERP'
+		self.g = ERPg
+		self.window = window
+
+		# Series and frontier storage, grown by doubling
+		self.n = 0
+		self.m = 0
+		self.a = np.empty(16)
+		self.b = np.empty(16)
+		self.lastRow = np.empty(16)
+		self.lastCol = np.empty(16)
+
+		self.extend(a,b)
+
+	@property
+	def cost(self):
+		'''Bottom left value of the cost matrix (infinity if either series is empty,
+		or the warp window does not reach it).
+		'''
+		if not _inWindow(self.n - 1,self.m - 1,self.window):
+			return np.inf
+
+		return self.lastRow[self.m - 1]
+
+	def extend(self,a=None,b=None):
+		'''Adds samples to the end of either or both time series.
+
+		Parameters
+		----------
+			a : float, list or numpy 1D-array
+				New samples of the first time series (optional)
+			b : float, list or numpy 1D-array
+				New samples of the second time series (optional)
+
+		Returns
+		-------
+			cost : float
+				Bottom left value of the updated cost matrix
+		'''
+		# New columns are calculated for the existing rows first, then the new rows
+		# are calculated across all of the columns
+		if b is not None:
+			b = np.atleast_1d(np.asarray(b, dtype=np.float64))
+			m0 = self.m
+			self.m += len(b)
+
+			self.b = _grow(self.b,self.m)
+			self.lastRow = _grow(self.lastRow,self.m)
+			self.b[m0:self.m] = b
+
+			_extendCols(self.a,self.b,self.n,m0,self.m,self.lastRow,self.lastCol,
+				self.window,self.erp,self.g)
+
+		if a is not None:
+			a = np.atleast_1d(np.asarray(a, dtype=np.float64))
+			n0 = self.n
+			self.n += len(a)
+
+			self.a = _grow(self.a,self.n)
+			self.lastCol = _grow(self.lastCol,self.n)
+			self.a[n0:self.n] = a
+
+			_extendRows(self.a,self.b,n0,self.n,self.m,self.lastRow,self.lastCol,
+				self.window,self.erp,self.g)
+
+		return self.cost
+
+	def path(self):
+		'''Finds the optimal warping path through the current cost matrix.  The 
+		cost matrix directions are recalculated to do this, so time is 
+		proportional to n x m (or n x w with a warp window).
+
+		Returns
+		-------
+			path : numpy array
+				List of pairs of coordinates in time-space describing the backtrace 
+				through the cost matrix
+			backTraceCost : float
+				The sum cost of following the backtrace through the cost matrix
+			warpStats : dict
+				Warp statistics object - see ``timeWarp()``
+
+		Notes
+		-----
+		* Raises ``ValueError`` if either series is empty, or the warp window does not reach the bottom left cell (series of very different lengths), as there is then no path.
+		'''
+		if self.n == 0 or self.m == 0:
+			raise ValueError("IncrementalWarp error - no path, as a time series is empty")
+
+		if self.cost == np.inf:
+			raise ValueError("IncrementalWarp error - no path, as the warp window does not reach the end of both series")
+
+		a = self.a[0:self.n]
+		b = self.b[0:self.m]
+
+		lo, hi = warpLimits(self.n,self.m,self.window)
+		start = bandOffsets(lo,hi)
+		cost, costBand, dirBand = warpBand(a,b,lo,hi,start,self.erp,self.g,False)
+
+		return backTraceBand(dirBand,a,b,lo,hi,start)
+
+
+def _grow(arr,size):
+	'''Returns an array with room for at least size entries, doubling the 
+	storage if it needs to grow.
+	'''
+	if size <= len(arr):
+		return arr
+
+	grown = np.empty(max(size, 2 * len(arr)))
+	grown[0:len(arr)] = arr
+
+	return grown
+
+
+@jit
+def _inWindow(i,j,w):
+	'''Whether cell (i, j) is inside the warp window.
+	'''
+	return i >= 0 and j >= 0 and (w == 0 or abs(i - j) < w)
+
+
+@jit
+def _extendRows(x,y,n0,n,m,lastRow,lastCol,w,erp,g):
+	'''Calculates rows n0 to n-1 of the cost matrix from the last row, updating
+	the last row and last column in place (see ``IncrementalWarp``).
+	'''
+	row = np.empty(m)
+	gap = _gapPoint(x,g)
+
+	for i in range(n0, n):
+		jLo = 0
+		jHi = m - 1
+		if w != 0:
+			jLo = max(0, i - w + 1)
+			jHi = min(m - 1, i + w - 1)
+
+		for j in range(jLo, jHi + 1):
+			diag = np.inf
+			up = np.inf
+			left = np.inf
+			if _inWindow(i-1,j-1,w):
+				diag = lastRow[j-1]
+			if _inWindow(i-1,j,w):
+				up = lastRow[j]
+			if j > jLo:
+				left = row[j-1]
+
+			row[j] = _warpCell(x,y,i,j,_L1(x,y,i,j),diag,up,left,gap,erp,g,_L1)
+
+		lastRow[jLo:jHi + 1] = row[jLo:jHi + 1]
+
+		lastCol[i] = np.inf
+		if m > 0 and _inWindow(i,m-1,w):
+			lastCol[i] = row[m-1]
+
+
+@jit
+def _extendCols(x,y,n,m0,m,lastRow,lastCol,w,erp,g):
+	'''Calculates columns m0 to m-1 of the cost matrix from the last column, 
+	updating the last column and last row in place (see ``IncrementalWarp``).
+	'''
+	gap = _gapPoint(x,g)
+
+	for j in range(m0, m):
+		iLo = 0
+		iHi = n - 1
+		if w != 0:
+			iLo = max(0, j - w + 1)
+			iHi = min(n - 1, j + w - 1)
+
+		# The previous column's value for the row above, before it is replaced
+		diag = np.inf
+		if iLo <= iHi and _inWindow(iLo-1,j-1,w):
+			diag = lastCol[iLo-1]
+
+		up = np.inf
+		for i in range(iLo, iHi + 1):
+			left = np.inf
+			if _inWindow(i,j-1,w):
+				left = lastCol[i]
+
+			up = _warpCell(x,y,i,j,_L1(x,y,i,j),diag,up,left,gap,erp,g,_L1)
+			diag = left
+			lastCol[i] = up
+
+		lastRow[j] = np.inf
+		if n > 0 and _inWindow(n-1,j,w):
+			lastRow[j] = lastCol[n-1]
+
+
+@jit
+def springUpdate(samples,template,threshold,cost,start,best,span,t):
+	'''Compiled SPRING update of the DTW column for a block of stream samples (see
+	``StreamMatcher``).  The state arrays are updated in place.
+
+	Parameters
+	----------
+		samples : numpy 1D-array
+			The new samples
+		template : numpy 1D-array
+			The pattern to look for
+		threshold : float
+			Highest DTW cost reported as a match
+		cost : numpy 1D-array
+			DTW column, with a leading zero so a path may start at any sample
+		start : numpy 1D-array
+			Stream index that the path to each cell of the column started at
+		best : numpy 1D-array
+			Cost of the best match not yet reported
+		span : numpy 1D-array
+			Start and end of the best match not yet reported
+		t : int
+			Stream index of the first new sample
+
+	Returns
+	-------
+		starts, ends, costs : numpy 1D-array
+			The matches completed by the new samples
+		t : int
+			Stream index of the next sample
+	'''
+	m = len(template)
+
+	starts = np.empty(len(samples), dtype=np.int64)
+	ends = np.empty(len(samples), dtype=np.int64)
+	costs = np.empty(len(samples))
+	found = 0
+
+	newCost = np.empty(m + 1)
+	newStart = np.empty(m + 1, dtype=np.int64)
+	gap = _gapPoint(template,0)
+
+	for k in range(len(samples)):
+		newCost[0] = 0
+		newStart[0] = t
+
+		# DTW recurrence down the column.  With the column of zeros before the 
+		# template, cell (t, i) of the subsequence cost matrix is an inside cell 
+		# (t + 1, i) of an ordinary DTW cost matrix, with stream samples as rows
+		for i in range(1, m + 1):
+			left = newCost[i-1]
+			up = cost[i]
+			diag = cost[i-1]
+
+			d = abs(samples[k] - template[i-1])
+			newCost[i] = _warpCell(samples,template,t + 1,i,d,diag,up,left,gap,False,0,_L1)
+
+			# The path to this cell started where the path to the cell it came from
+			# started.  Between paths of equal cost, the one which started latest is
+			# kept, as it overlaps the fewest earlier matches, which are cleared when
+			# they are reported
+			step = min(diag, up, left)
+			newStart[i] = -1
+			if diag == step:
+				newStart[i] = start[i-1]
+			if up == step:
+				newStart[i] = max(newStart[i], start[i])
+			if left == step:
+				newStart[i] = max(newStart[i], newStart[i-1])
+
+		# Report the best match once no path which overlaps it can beat it
+		if best[0] <= threshold:
+			done = True
+			for i in range(1, m + 1):
+				if newCost[i] < best[0] and newStart[i] <= span[1]:
+					done = False
+					break
+
+			if done:
+				starts[found] = span[0]
+				ends[found] = span[1]
+				costs[found] = best[0]
+				found += 1
+
+				best[0] = np.inf
+				for i in range(1, m + 1):
+					if newStart[i] <= span[1]:
+						newCost[i] = np.inf
+
+		if newCost[m] <= threshold and newCost[m] < best[0]:
+			best[0] = newCost[m]
+			span[0] = newStart[m]
+			span[1] = t
+
+		cost[:] = newCost
+		start[:] = newStart
+		t += 1
+
+	return starts[0:found], ends[0:found], costs[0:found], t
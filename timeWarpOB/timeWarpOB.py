@@ -3,47 +3,370 @@ import numpy as np
 
 # Check if the numba module is installed (compiled, high-speed functions)
 import importlib.util
+import os
+import time
+from contextlib import contextmanager
+from collections.abc import MutableMapping
 foundNumba = importlib.util.find_spec("numba") is not None
 
-if foundNumba:
-	#Numba is installed, import @jit decorator
-	from numba import jit
+# The backend in use, 'numba' or 'numpy'.  The numpy backend is used if numba 
+# is not installed, or if TIMEWARPOB_BACKEND=numpy is set before timeWarpOB is
+# first used.
+backend = 'numba'
+if not foundNumba or os.environ.get('TIMEWARPOB_BACKEND') == 'numpy':
+	backend = 'numpy'
+
+if backend == 'numba':
+	#Numba is installed, import @jit decorator and parallel range
+	from numba import jit, prange
 else:
-	# Numba not installed, warn the user and make a blank @jit decorator
-	def jit(f):
-		'''Numba was not found in the current python environment
+	# Numba not used, so the @jit decorator swaps in the vectorised numpy version
+	# of a function where there is one (see vectorised.py)
+	from . import vectorised
+
+	def jit(f=None,**kwargs):
+		'''Numba is not used - returns the vectorised version of the function, or
+		the function unchanged
+		'''
+		if f is None:
+			# Used with options, e.g. @jit(parallel=True)
+			return jit
+
+		return getattr(vectorised, f.__name__, f)
+
+	prange = range
+
+
+# Function called with the profile of every timeWarp() call (see 
+# setProfileHook())
+_profileHook = None
+
+
+def setProfileHook(hook):
+	'''Sets a function to be called with the profile of every ``timeWarp()`` 
+	call, e.g. to log slow alignments in production.  The profile is a dict - 
+	see the ``profile`` parameter of ``timeWarp()``.
+
+	Parameters
+	----------
+		hook : function
+			Function taking the profile dict, or None to stop profiling
+	'''
+	global _profileHook
+	_profileHook = hook
+
+
+class _NoProfiler(object):
+	'''Stands in for ``_Profiler`` when profiling is off, doing nothing.
+	'''
+
+	def stage(self,name):
+		return self
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self,*args):
+		return False
+
+	def cells(self,evaluated,total):
+		pass
+
+	def matrices(self,*arrays):
+		pass
+
+	def finish(self,warpObj):
+		return warpObj
+
+
+_noProfiler = _NoProfiler()
+
+
+class _Profiler(object):
+	'''Records the time taken by each stage of a ``timeWarp()`` call, and the 
+	work done (see the ``profile`` parameter of ``timeWarp()``).
+	'''
+
+	def __init__(self,hook=None):
+		self.hook = hook
+		self.profile = {"stages": {"distance": 0.0, "recurrence": 0.0, "backtrace": 0.0, "tolist": 0.0, "compile": 0.0},
+			"cellsEvaluated": 0, "cellsPruned": 0, "peakBytes": 0}
+
+	@contextmanager
+	def stage(self,name):
+		'''Times a stage, with any numba compilation during it timed separately.
+		'''
+		compiled = []
+		t0 = time.perf_counter()
+
+		if backend == 'numba':
+			from numba.core import event
+			with event.install_timer("numba:compile", compiled.append):
+				yield
+		else:
+			yield
+
+		wall = time.perf_counter() - t0
+		self.profile["stages"][name] += wall - sum(compiled)
+		self.profile["stages"]["compile"] += sum(compiled)
+
+	def cells(self,evaluated,total):
+		'''Counts the cells of the cost matrix calculated, and skipped.
+		'''
+		self.profile["cellsEvaluated"] += int(evaluated)
+		self.profile["cellsPruned"] += int(total - evaluated)
+
+	def matrices(self,*arrays):
+		'''Counts the memory of matrices which are all held at the same time.
+		'''
+		held = 0
+		for arr in arrays:
+			# Reshaped matrices share the memory of their band
+			if arr.base is None or not any(arr.base is other for other in arrays):
+				held += arr.nbytes
+
+		self.profile["peakBytes"] = max(self.profile["peakBytes"], held)
+
+	def finish(self,warpObj):
+		'''Adds the profile to the warp object, and calls the hook.
+		'''
+		warpObj["profile"] = self.profile
+
+		if self.hook is not None:
+			self.hook(self.profile)
+
+		return warpObj
+
+
+class WarpResult(MutableMapping):
+	'''The warp object returned by ``timeWarp()``.  The items can be read as 
+	attributes (``result.cost``) or as dict keys (``result["cost"]``), and the 
+	object is a mapping like the dict returned by earlier versions (including 
+	``==``, ``copy()``, ``update()``, ``pop()`` and ``setdefault()``).  Items 
+	which were not calculated (e.g. ``costMat`` with ``retMat = False``) are 
+	missing, raising KeyError or AttributeError.
+
+	If the time series were supplied as lists, the path and matrices are kept as
+	numpy arrays and only converted to lists when they are first read, so 
+	results which are never read are never converted.
+
+	Other keys can be added (e.g. ``result["label"] = ...``) as with a dict, and
+	the keys are listed in the order they were added.
+
+	Parameters
+	----------
+		asList : bool
+			Whether the path and matrices are returned as lists (default = False)
+	'''
+
+	__slots__ = ('cost', 'channelCost', 'backTraceCost', 'warpStats', 'warpWindow',
+		'abandoned', 'profile', '_backTracePath', '_costMat', '_distMat', '_asList',
+		'_extra', '_order')
+
+	# Items of the warp object, in the order they are listed
+	fields = ('cost', 'channelCost', 'backTraceCost', 'backTracePath', 'warpStats',
+		'warpWindow', 'costMat', 'distMat', 'abandoned', 'profile')
+
+	def __init__(self,asList=False):
+		self._asList = asList
+
+		# Keys which are not items of the warp object, and the order that all of
+		# the keys were added in
+		self._extra = {}
+		self._order = []
+
+	def _listed(self,name):
+		'''Returns an item, converting it to a list the first time it is read if
+		the time series were lists.  Memory-mapped matrices are not converted.
+		'''
+		value = getattr(self,name)
+
+		if self._asList:
+			t0 = time.perf_counter()
+
+			if type(value) == np.ndarray:
+				value = value.tolist()
+				setattr(self,name,value)
+			elif type(value) == list and len(value) > 0 and type(value[0]) == np.ndarray:
+				# One array per channel
+				value = [v.tolist() for v in value]
+				setattr(self,name,value)
+			else:
+				return value
+
+			# The conversion is added to the profile when it happens
+			if hasattr(self, 'profile'):
+				self.profile["stages"]["tolist"] += time.perf_counter() - t0
+
+		return value
+
+	@property
+	def backTracePath(self):
+		return self._listed('_backTracePath')
+
+	@backTracePath.setter
+	def backTracePath(self,value):
+		self._backTracePath = value
+
+	@property
+	def costMat(self):
+		return self._listed('_costMat')
+
+	@costMat.setter
+	def costMat(self,value):
+		self._costMat = value
+
+	@property
+	def distMat(self):
+		return self._listed('_distMat')
+
+	@distMat.setter
+	def distMat(self,value):
+		self._distMat = value
+
+	def _stored(self,key):
+		'''Whether an item has been set, without converting it to a list.
+		'''
+		if key not in self.fields:
+			return key in self._extra
+
+		return hasattr(self, key if key in self.__slots__ else '_' + key)
+
+	def __getitem__(self,key):
+		if key not in self.fields:
+			return self._extra[key]
+
+		try:
+			return getattr(self,key)
+		except AttributeError:
+			raise KeyError(key)
+
+	def __setitem__(self,key,value):
+		if not self._stored(key):
+			self._order.append(key)
+
+		if key not in self.fields:
+			self._extra[key] = value
+		else:
+			setattr(self,key,value)
+
+	def __delitem__(self,key):
+		if not self._stored(key):
+			raise KeyError(key)
+
+		if key not in self.fields:
+			del self._extra[key]
+		else:
+			delattr(self, key if key in self.__slots__ else '_' + key)
+
+		if key in self._order:
+			self._order.remove(key)
+
+	def __contains__(self,key):
+		# Checked without reading the item, so lists are not built
+		return self._stored(key)
+
+	def __iter__(self):
+		'''Names of the items which were calculated, and any other keys added, in
+		the order they were added.
+		'''
+		keys = [key for key in self._order if self._stored(key)]
+
+		# Items set as attributes rather than keys
+		keys += [key for key in self.fields if key not in keys and self._stored(key)]
+
+		return iter(keys)
+
+	def __len__(self):
+		return len(list(iter(self)))
+
+	def copy(self):
+		'''Returns a shallow copy, as a dict.
 		'''
-		return f
+		return dict(self)
 
+	def __repr__(self):
+		return 'WarpResult(' + ', '.join(self) + ')'
 
-def timeWarp(a,b,method='DTW',window=0,retMat=True,**kwargs):
+
+def timeWarp(a,b,method='DTW',window=0,retMat=True,retPath=True,constraint=None,multivariate='dependent',metric='L1',dtype=np.float64,memmap=None,linearPath=False,upperBound=None,profile=False,**kwargs):
 	'''This function is the main time warping interface, and acts
 	as a convenient wrapper to the other functions.
 
 	Parameters
 	----------
 		a : list or numpy 1D-array
-			First time series, which will be compared against time series b
+			First time series, which will be compared against time series b.  For 
+			series with more than one channel, use a 2D array (or list of lists) 
+			with one row per time period and one column per channel.
 		b : list or numpy 1D-array
-			Second time series (reference)
+			Second time series (reference), with the same channels as a
 		method : str
-			Time warping method ``{'DTW','ERP'}`` - see below
+			Time warping method ``{'DTW','ERP','FastDTW'}`` - see below
 		window : int
-			Time warping window constraint (default = 0)
+			Time warping window constraint (default = 0, not used by FastDTW).  Only the cells within the 
+			window are calculated, so the time taken grows linearly with the length of 
+			the series
 		retMat : bool
 			Whether to include the cost matrices in the returned object
+		retPath : bool
+			Whether to backtrace the warp path.  If both ``retMat`` and ``retPath`` are
+			False, only the cost is calculated, using memory proportional to the
+			length of the series rather than n x n (default = True)
+		constraint : str or tuple
+			Global constraint on the warp path, in addition to the warp window.  Either
+			``'itakura'`` for the Itakura parallelogram (see ``itakuraLimits()``), or 
+			a tuple ``(lo, hi)`` giving the first and last allowed column of each row of
+			the cost matrix.  Cells outside the allowed region are not calculated 
+			(default = None, not used by FastDTW)
+		multivariate : str
+			How series with more than one channel are warped - see below 
+			``{'dependent','independent'}`` (default = 'dependent')
+		metric : str or function
+			Distance metric between two time periods, either the name of a metric
+			in the registry ``{'L1','L2','sqeuclidean','chebyshev'}`` or a 
+			function - see ``registerMetric()`` (default = 'L1')
+		dtype : numpy dtype
+			Precision of the cost and distance matrices, and of the cost 
+			calculation ``{np.float64, np.float32}`` - see below (default = 
+			np.float64)
+		memmap : str or tuple
+			Write the cost and distance matrices into memory-mapped files, for series
+			too long for the matrices to fit in memory.  Either the path of a 
+			directory, in which ``costMat.npy`` and ``distMat.npy`` are created, or a
+			tuple ``(costMat, distMat)`` of n x n ``np.memmap`` arrays of type dtype
+			(for ``retMat = True`` only, default = None) - see below
+		linearPath : bool
+			Find the exact warp path in memory proportional to the length of the 
+			series, rather than keeping a backtrace direction for every cell of the 
+			warp window (for ``retMat = False`` only, default = False) - see 
+			``warpLinear()``
+		upperBound : float
+			Abandon the warp if its cost is higher than this, e.g. the best cost 
+			found so far in a search (default = None, never abandoned) - see below
+		profile : bool or function
+			Record the time taken by each stage of the warp, and the work done, in 
+			``warpObj.profile``.  If a function is given, it is also called with
+			the profile (default = False) - see below and ``setProfileHook()``
+		slope : float
+			Steepest slope of the Itakura parallelogram (for ``constraint = 'itakura'``
+			only, default = 2)
 		ERPg :	int
 			g-value (for ``method = 'ERP'`` only)
+		radius : int
+			Search radius at each resolution (for ``method = 'FastDTW'`` only, 
+			default = 1) - see ``fastWarpLimits()``
 
 	Returns
 	-------
-		warpObj : dict
-			A timeWarpOB warp object, containing the following items:
+		warpObj : WarpResult
+			A timeWarpOB warp object (see ``WarpResult``), containing the following items:
 		warpObj.backTraceCost : float
-			The sum cost of following the backtrace through the cost matrix
+			The sum cost of following the backtrace through the cost matrix.  Only 
+			output if ``retPath = True`` in the input parameters
 		warpObj.backTracePath : list
 			List or numpy array of pairs of coordinates in time-space describing the backtrace through
-			the cost matrix
+			the cost matrix.  Only output if ``retPath = True`` in the input parameters
 		warpObj.cost : float
 			Bottom left value on the cost matrix.  With no warping window, this should 
 			equal warpObj.backTraceCost
@@ -55,10 +378,13 @@ def timeWarp(a,b,method='DTW',window=0,retMat=True,**kwargs):
 			A matrix (list of lists) or numpy array describing the L1-distance matrix between the two 
 			time series.  For a series of length n, this matrix will be of size n x n.  
 			Only output if ``retMat = True`` in the input parameters
+		warpObj.abandoned : bool
+			Whether the warp was abandoned for costing more than ``upperBound``.  
+			Only output if ``upperBound`` is given in the input parameters
 		warpObj.warpWindow : int
 			Returning the warp window parameter used (used by plotting functions)
 		warpObj.warpStats : dict
-			Warp statistics object, containing:		
+			Warp statistics object (only output if ``retPath = True``), containing:		
 		warpObj.warpStats.timeAhead : int
 			The number of periods that time series a was in sync with time series b.
 		warpObj.warpStats.timeAhead : int
@@ -85,7 +411,7 @@ def timeWarp(a,b,method='DTW',window=0,retMat=True,**kwargs):
 
 	Notes
 	-----
-	* If lists are supplied, the output matrices will be in list form.  If numpy arrays are supplied, the output will be as numpy arrays.
+	* If lists are supplied, the output matrices will be in list form (converted when they are first read).  If numpy arrays are supplied, the output will be as numpy arrays.
 
 	* Numpy arrays will calculate faster, as no internal type conversion is required.
 
@@ -93,8 +419,26 @@ def timeWarp(a,b,method='DTW',window=0,retMat=True,**kwargs):
 
 	* ERP and DTW methods are available.  For information on how they work, see the module documentation.
 
+	* FastDTW gives an approximation to DTW (the cost can only be higher) in time proportional to the length of the series, for exploratory work on very long series.
+
 	* Cost matricies should be returned for use by the plotting functions
 
+	* With a warp window, the full matrices are only built if ``retMat = True``.  Use ``retMat = False`` to keep memory use linear in the length of the series.
+
+	* The time series are used in their own type, so integer samples (e.g. int16) are not converted to floats first.  With ``dtype = np.float32`` the cost and distance matrices take half the memory, and the costs are rounded to float32 as they are added up, so results are close to (but not always exactly equal to) the float64 results.
+
+	* When the warp window (or the full cost matrix) has more than ``TILED_CELLS`` cells, the cost matrix is filled in tiles by several processor cores at once - see ``warpTiled()``.
+
+	* With ``memmap``, the cost and distance matrices are filled row by row straight into the files (see ``warpRows()``), and the backtrace reads the cost matrix back in blocks of rows.  ``costMat`` and ``distMat`` are returned as the ``np.memmap`` arrays, even if lists are supplied, and the files can be opened again with ``np.load(path, mmap_mode='r')``.  ``memmap`` cannot be used with ``multivariate = 'independent'``.
+
+	* With ``linearPath = True`` (and ``retMat = False``), the path is found by recalculating parts of the cost matrix, so it takes a little longer, but even series too long for the backtrace directions to fit in memory can be warped.  The path is the same as without ``linearPath``.
+
+	* With ``upperBound``, the cost matrix is calculated row by row, and the calculation stops as soon as every cell of a row costs more than the bound, as the cost can then only be higher.  If the cost is higher than the bound, ``abandoned`` is True, ``cost`` is infinity and no path or matrices are returned.  Tiled warps stop once every cell on the edges of an anti-diagonal of tiles, and the bottom right corners of the tiles on the anti-diagonal before it, costs more than the bound.  ``upperBound`` cannot be used with ``multivariate = 'independent'``.
+
+	* With ``profile``, ``warpObj.profile`` is a dict containing ``stages``, the time in seconds taken by each stage (``'distance'``: building the distance matrix, ``'recurrence'``: calculating the cost matrix, including the distances within it, ``'backtrace'``, ``'tolist'``: converting the results to lists, and ``'compile'``: numba compilation during any of the stages), ``cellsEvaluated`` and ``cellsPruned``, the number of cells of the cost matrix calculated and skipped (outside the warp window), and ``peakBytes``, the memory of the cost, direction and distance matrices held at once.  As lists are only built when they are read, the ``'tolist'`` time is added when they are read.  Profiling is off by default, and then takes no time.
+
+	* Series with more than one channel are warped together along one path by default (``multivariate = 'dependent'``), with the L1 distances of the channels added together.  With ``multivariate = 'independent'``, each channel is warped separately (in parallel) and ``cost`` is the sum of the channel costs.  ``channelCost``, ``backTraceCost``, ``backTracePath``, ``warpStats``, ``costMat`` and ``distMat`` are then lists with one entry per channel.
+
 	'''
 
 	# Check if a list has been passed or numpy object
@@ -107,215 +451,1746 @@ def timeWarp(a,b,method='DTW',window=0,retMat=True,**kwargs):
 		usingList = True
 		b = np.array(b)
 
-	# Create a warp object to return
-	warpObj = {}
+	# Create a warp object to return, converting to lists when it is read
+	warpObj = WarpResult(usingList)
 
 	# Clip any longer time series
 	minLen = min(len(a),len(b))
 	a = a[0:minLen]
 	b = b[0:minLen]
 
-	# Get distance matrix
-	dist = L1distances(a,b)
-	
-	# Get the cost matrix
-	if method == 'DTW':
-		costMat = DTWwarp(dist,a,b,w=window)
-	elif method == 'ERP':
-		ERPg = 0
+	# One row per time period and one column per channel
+	x = _channels(a)
+	y = _channels(b)
+
+	if x.shape[1] != y.shape[1]:
+		print("timeWarp error - time series have different numbers of channels:", x.shape[1], y.shape[1])
+		return -1
+
+	# Single channel series are warped as 1D-arrays
+	if x.shape[1] == 1:
+		x = x.reshape(-1)
+		y = y.reshape(-1)
+
+	# Get the warp method
+	erp = False
+	ERPg = 0
+	if method == 'ERP':
+		erp = True
 		if 'ERPg' in kwargs:
 			ERPg = kwargs['ERPg']
-		costMat = ERPwarp(dist,a,b,w=window,g=ERPg)
-	else:
+	elif method != 'DTW' and method != 'FastDTW':
 		print("timeWarp error - incorrect warp method specified:", method)
 		return -1
 
-	# Extract the cost
-	cIndex = len(costMat[0]) - 1
-	cost = costMat[cIndex,cIndex]
+	if multivariate != 'dependent' and multivariate != 'independent':
+		print("timeWarp error - incorrect multivariate mode specified:", multivariate)
+		return -1
 
-	# Backtrace the warp path
-	path, backTraceCost, warpStats = backTrace(costMat,dist)
+	metricName = metric
+	metric = _getMetric(metric)
+	if metric is None:
+		print("timeWarp error - incorrect metric specified:", metricName)
+		return -1
 
-	# Return the results
-	if retMat == True:
-		if usingList:
-			warpObj["costMat"] = costMat.tolist()
-			warpObj["distMat"] = dist.tolist()
-		else:
-			warpObj["costMat"] = costMat
-			warpObj["distMat"] = dist
-	
-	warpObj["cost"] = cost
-	warpObj["backTraceCost"] = backTraceCost
-	warpObj["warpStats"] = warpStats
+	dtype = np.dtype(dtype)
+	if dtype != np.float64 and dtype != np.float32:
+		print("timeWarp error - dtype must be np.float64 or np.float32:", dtype)
+		return -1
+	dtype = dtype.type
+
+	if upperBound is not None and multivariate == 'independent' and x.ndim == 2:
+		print("timeWarp error - upperBound cannot be used with multivariate = 'independent'")
+		return -1
+
+	profiler = _noProfiler
+	if profile or _profileHook is not None:
+		profiler = _Profiler(profile if callable(profile) else _profileHook)
+
+	# Memory-mapped cost and distance matrices, created here or supplied
+	mapped = memmap is not None and retMat == True
+	if mapped:
+		if multivariate == 'independent' and x.ndim == 2:
+			print("timeWarp error - memmap cannot be used with multivariate = 'independent'")
+			return -1
 
-	if usingList:
-		warpObj["backTracePath"] = path.tolist()
+		if type(memmap) == str:
+			costMat, distMat = _openMatrices(memmap,minLen,minLen,dtype)
+		else:
+			costMat, distMat = memmap
+			for mat in [costMat, distMat]:
+				if mat.shape != (minLen,minLen) or mat.dtype != dtype:
+					print("timeWarp error - memmap matrices must be n x n arrays of type", np.dtype(dtype).name + ":", mat.shape, mat.dtype)
+					return -1
+
+	# Only the cells inside the warp window are calculated
+	if method == 'FastDTW':
+		radius = 1
+		if 'radius' in kwargs:
+			radius = kwargs['radius']
+		with profiler.stage('recurrence'):
+			lo, hi = fastWarpLimits(x,y,radius,metric)
 	else:
-		warpObj["backTracePath"] = path
-	
+		lo, hi = warpLimits(minLen,minLen,window)
+
+		if constraint is not None:
+			if type(constraint) == str and constraint == 'itakura':
+				slope = 2
+				if 'slope' in kwargs:
+					slope = kwargs['slope']
+				cLo, cHi = itakuraLimits(minLen,minLen,slope)
+			else:
+				cLo = np.asarray(constraint[0], dtype=np.int64)
+				cHi = np.asarray(constraint[1], dtype=np.int64)
+
+				if cLo.shape != (minLen,) or cHi.shape != (minLen,):
+					print("timeWarp error - incorrect constraint specified: lo and hi must have one entry for each of the", minLen, "rows of the cost matrix")
+					return -1
+
+			lo = np.maximum(lo, cLo)
+			hi = np.minimum(hi, cHi)
+
+			problem = checkLimits(lo,hi,minLen)
+			if problem is not None:
+				print("timeWarp error - incorrect constraint specified:", problem)
+				return -1
+
+	start = bandOffsets(lo,hi)
+
 	if window == 0:
 		warpObj["warpWindow"] = len(a)
 	else:
 		warpObj["warpWindow"] = window
 
-	return warpObj
+	if multivariate == 'independent' and x.ndim == 2:
+		return _warpIndependent(warpObj,x,y,lo,hi,start,erp,ERPg,retMat,retPath,metric,dtype,profiler)
 
+	# The calculation stops early if the cost is higher than the upper bound, 
+	# and the cells calculated are counted for the profile
+	ub = np.inf
+	if upperBound is not None:
+		ub = upperBound
+	cells = np.zeros(1, dtype=np.int64)
 
-@jit
-def L1distances(a,b):
-	'''Calcluates the L1 distance matrix between two time series.
+	if mapped:
+		return _warpMapped(warpObj,x,y,lo,hi,erp,ERPg,retPath,metric,costMat,distMat,profiler,upperBound,cells)
 
-	Parameters
-	----------
-		a : list
-			First time series, which will be compared against time series b
-		b : list 
-			Second time series (reference)
+	# Large bands are split into tiles, which are filled by several processor 
+	# cores at once
+	tiled = start[-1] >= TILED_CELLS
 
-	Returns
-	-------
-		distance : list	
-			A matrix (list of lists) describing the L1-distance matrix between the two 
-			time series.  For a series of length n, this matrix will be of size n x n.  
-	'''
-	n = len(a)
-	m = len(b)
+	# Exact path without storing the backtrace directions
+	if linearPath == True and retMat == False and retPath == True:
+		with profiler.stage('recurrence'):
+			cost, path, backTraceCost, warpStats = warpLinear(x,y,lo,hi,erp,ERPg,metric,dtype,ub,cells)
+		profiler.cells(cells[0],minLen * minLen)
 
-	distance = np.zeros((n,m))
+		warpObj["cost"] = cost
+		if _abandoned(warpObj,cost,upperBound):
+			return profiler.finish(warpObj)
 
-	for i in range(n):
-		for j in range(m):
-			distance[i,j] = abs(a[i] - b[j])
+		warpObj["backTraceCost"] = backTraceCost
+		warpObj["warpStats"] = warpStats
+		warpObj["backTracePath"] = path
+		return profiler.finish(warpObj)
 
-	return distance 
+	# Cost only, using two rolling rows of the cost matrix
+	if retMat == False and retPath == False:
+		with profiler.stage('recurrence'):
+			if tiled:
+				warpObj["cost"] = warpTiled(x,y,lo,hi,start,erp,ERPg,False,False,metric,TILE_SIZE,dtype,ub,cells)[0]
+			else:
+				warpObj["cost"] = warpCost(x,y,lo,hi,erp,ERPg,metric,dtype,ub,cells)
+		profiler.cells(cells[0],minLen * minLen)
 
-@jit
-def ERPwarp(dist,x,y,w=0,g=0):
-	'''Calcluates the ERP cost matrix between two time series.
+		_abandoned(warpObj,warpObj["cost"],upperBound)
+		return profiler.finish(warpObj)
 
-	Parameters
-	----------
-		dist : list
-			A matrix (list of lists) describing the L1-distance matrix between two 
-			time series.  For a time series of length n, this matrix must be of size n x n.
-		x : list
-			First time series, which will be compared against time series y
-		y : list 
-			Second time series (reference)
-		w : int
-			Time warping window constraint (default = 0)
-		g :	int
-			ERP g-value (deafult = 0)
+	# Get the cost matrix, keeping only the backtrace directions if the 
+	# matrices are not returned
+	with profiler.stage('recurrence'):
+		if tiled:
+			cost, costBand, dirBand = warpTiled(x,y,lo,hi,start,erp,ERPg,retMat,True,metric,TILE_SIZE,dtype,ub,cells)
+		else:
+			cost, costBand, dirBand = warpBand(x,y,lo,hi,start,erp,ERPg,retMat,metric,dtype,ub,cells)
+	warpObj["cost"] = cost
+	profiler.cells(cells[0],minLen * minLen)
+	profiler.matrices(costBand,dirBand)
 
-	Returns
-	-------
-		costMat : list
-			A matrix (list of lists) describing the ERP cost matrix between the two time 
-			series.  For a series of length n, this matrix will be of size n x n. 
+	if _abandoned(warpObj,cost,upperBound):
+		return profiler.finish(warpObj)
+
+	# Backtrace the warp path
+	if retPath == True:
+		with profiler.stage('backtrace'):
+			path, backTraceCost, warpStats = backTraceBand(dirBand,x,y,lo,hi,start,metric)
+
+		warpObj["backTraceCost"] = backTraceCost
+		warpObj["warpStats"] = warpStats
+		warpObj["backTracePath"] = path
+
+	# Return the full matrices, expanding the band if needed
+	if retMat == True:
+		with profiler.stage('recurrence'):
+			if start[-1] == minLen * minLen:
+				costMat = costBand.reshape(minLen,minLen)
+			else:
+				costMat = bandToDense(costBand,lo,hi,start,minLen)
+
+		# The distance matrix is only built when it is returned
+		with profiler.stage('distance'):
+			dist = _distMatrix(x,y,metric,dtype)
+
+		warpObj["costMat"] = costMat
+		warpObj["distMat"] = dist
+		profiler.matrices(costBand,dirBand,costMat,dist)
+	
+	return profiler.finish(warpObj)
+
+
+def _abandoned(warpObj,cost,upperBound):
+	'''Records whether a warp is abandoned for costing more than the upper bound 
+	(see ``timeWarp()``), setting the cost to infinity if it is.
+	'''
+	if upperBound is None:
+		return False
+
+	abandoned = not cost <= upperBound
+	warpObj["abandoned"] = abandoned
+	if abandoned:
+		warpObj["cost"] = np.inf
+
+	return abandoned
+
+
+def _warpIndependent(warpObj,x,y,lo,hi,start,erp,g,retMat,retPath,metric,dtype,profiler):
+	'''Warps each channel of two multichannel time series separately, filling the 
+	warp object with lists of per-channel results (see ``timeWarp()``).
 	'''
 	n = len(x)
 	m = len(y)
 
-	costMat = np.zeros((n,m))
+	# Each channel is warped as a contiguous single-channel series
+	xc = np.ascontiguousarray(x.T)
+	yc = np.ascontiguousarray(y.T)
 
-	costMat[0,0] = dist[0,0]
+	# The backtraces are part of the compiled channel warps
+	with profiler.stage('recurrence'):
+		costs, costBands, paths, pathLengths, backTraceCosts, counters = _warpChannels(xc,yc,lo,hi,start,erp,g,retMat,retPath,metric,dtype)
+	profiler.cells(len(costs) * start[-1],len(costs) * n * m)
 
-	# Fill the edges
-	for i in range(1, n):
-		costMat[0,i] =  costMat[0,i-1] + abs(dist[0,i] - g)
+	warpObj["cost"] = costs.sum()
+	warpObj["channelCost"] = costs.tolist()
 
-	for i in range(1, n):
-		costMat[i,0] = costMat[i-1,0] + abs(dist[i,0] - g)
+	if retPath == True:
+		warpObj["backTraceCost"] = backTraceCosts.tolist()
+		warpObj["warpStats"] = [_warpStats(*c) for c in counters]
 
-	# Fill the rest of the matrix
-	for i in range(1, n):
-		for j in range(1, n):
-			OpMatch = costMat[i-1,j-1] + dist[i,j]
-			OpIns = costMat[i-1,j] + abs(x[i] - g)
-			OpDel = costMat[i,j-1] + abs(y[i] - g)
+		warpObj["backTracePath"] = [paths[c,0:pathLengths[c]] for c in range(len(costs))]
 
-			costMat[i,j] = min(OpMatch,OpDel,OpIns)
+	if retMat == True:
+		costMats = []
+		dists = []
+		for c in range(len(costs)):
+			with profiler.stage('recurrence'):
+				if start[-1] == n * m:
+					costMat = costBands[c].reshape(n,m)
+				else:
+					costMat = bandToDense(costBands[c],lo,hi,start,m)
+
+			with profiler.stage('distance'):
+				dist = _distMatrix(xc[c],yc[c],metric,dtype)
+
+			costMats.append(costMat)
+			dists.append(dist)
+
+		warpObj["costMat"] = costMats
+		warpObj["distMat"] = dists
+		profiler.matrices(costBands,*(costMats + dists))
+	else:
+		profiler.matrices(costBands)
 
-	# Apply warp window
-	if w != 0:
-		for i in range(0, n):
-			for j in range(0, n):
-				if abs(i-j) >= w:
-					costMat[i,j] = np.inf
+	return profiler.finish(warpObj)
 
-	return costMat
 
+def _warpMapped(warpObj,x,y,lo,hi,erp,g,retPath,metric,costMat,distMat,profiler,upperBound,cells):
+	'''Fills memory-mapped cost and distance matrices row by row, and backtraces
+	through them, filling the warp object (see ``timeWarp()``).
+	'''
+	ub = np.inf
+	if upperBound is not None:
+		ub = upperBound
 
-@jit
-def DTWwarp(dist,x,y,w=0):
-	'''Calcluates the ERP cost matrix between two time series.
+	with profiler.stage('recurrence'):
+		warpObj["cost"] = warpRows(x,y,lo,hi,costMat,distMat,erp,g,metric,ub,cells)
+
+		for mat in [costMat, distMat]:
+			if isinstance(mat, np.memmap):
+				mat.flush()
+	profiler.cells(cells[0],len(x) * len(y))
+
+	if _abandoned(warpObj,warpObj["cost"],upperBound):
+		return profiler.finish(warpObj)
+
+	if retPath == True:
+		with profiler.stage('backtrace'):
+			path, backTraceCost, counters = _backTraceMapped(costMat,distMat,lo)
+
+		warpObj["backTraceCost"] = backTraceCost
+		warpObj["warpStats"] = _warpStats(*counters)
+		warpObj["backTracePath"] = path
+
+	warpObj["costMat"] = costMat
+	warpObj["distMat"] = distMat
+
+	return profiler.finish(warpObj)
+
+
+def _openMatrices(directory,n,m,dtype):
+	'''Creates n x m memory-mapped cost and distance matrices, as ``costMat.npy``
+	and ``distMat.npy`` in a directory.
+	'''
+	os.makedirs(directory, exist_ok=True)
+
+	costMat = np.lib.format.open_memmap(os.path.join(directory, 'costMat.npy'), mode='w+', dtype=dtype, shape=(n,m))
+	distMat = np.lib.format.open_memmap(os.path.join(directory, 'distMat.npy'), mode='w+', dtype=dtype, shape=(n,m))
+
+	return costMat, distMat
+
+
+@jit(parallel=True)
+def _warpChannels(x,y,lo,hi,start,erp,g,retCost,retPath,metric,dtype):
+	'''Compiled warp of each channel of two multichannel time series, stored with
+	one row per channel, in parallel across the channels (see ``timeWarp()``).
+	'''
+	d = x.shape[0]
+	n = x.shape[1]
+	m = y.shape[1]
+
+	costs = np.empty(d)
+	backTraceCosts = np.zeros(d)
+	counters = np.zeros((d,5), dtype=np.int64)
+	pathLengths = np.zeros(d, dtype=np.int64)
+
+	cells = 0
+	if retCost:
+		cells = start[n]
+	costBands = np.empty((d,cells), dtype=dtype)
+
+	steps = 0
+	if retPath:
+		steps = n + m - 1
+	paths = np.empty((d,steps,2), dtype=np.int32)
+
+	for c in prange(d):
+		xc = x[c]
+		yc = y[c]
+
+		if retCost or retPath:
+			cost, costBand, dirBand = warpBand(xc,yc,lo,hi,start,erp,g,retCost,metric,dtype)
+			costs[c] = cost
+
+			if retCost:
+				costBands[c] = costBand
+
+			if retPath:
+				path, backTraceCost, counter = _backTraceDir(dirBand,xc,yc,lo,hi,start,metric)
+				paths[c,0:len(path)] = path
+				pathLengths[c] = len(path)
+				backTraceCosts[c] = backTraceCost
+				for k in range(5):
+					counters[c,k] = counter[k]
+		else:
+			costs[c] = warpCost(xc,yc,lo,hi,erp,g,metric,dtype)
+
+	return costs, costBands, paths, pathLengths, backTraceCosts, counters
+
+
+def timeWarpMany(query,references,method='DTW',window=0,retPath=False,metric='L1',**kwargs):
+	'''Warps one time series against each of a set of references, in a single 
+	compiled call that is spread across all of the available processor cores.
 
 	Parameters
 	----------
-		dist : list
-			A matrix (list of lists) describing the L1-distance matrix between two 
-			time series.  For a time series of length n, this matrix must be of size n x n.
-		x : list
-			First time series, which will be compared against time series y
-		y : list 
-			Second time series (reference)
-		w : int
+		query : list or numpy 1D-array
+			Time series, which will be compared against each of the references
+		references : list or numpy 2D-array
+			The reference time series.  A list may contain series of different 
+			lengths.
+		method : str
+			Time warping method ``{'DTW','ERP'}``
+		window : int
 			Time warping window constraint (default = 0)
+		retPath : bool
+			Whether to backtrace the warp paths.  If False, only the costs are 
+			calculated, using memory proportional to the length of the series 
+			(default = False)
+		metric : str or function
+			Distance metric - see ``timeWarp()`` (default = 'L1')
+		ERPg :	int
+			g-value (for ``method = 'ERP'`` only)
 
 	Returns
 	-------
-		costMat : list
-			A matrix (list of lists) describing the DTW cost matrix between the two time 
-			series.  For a series of length n, this matrix will be of size n x n. 
+		warpObj : dict
+			A timeWarpOB warp object, containing the following items:
+		warpObj.cost : numpy 1D-array
+			The cost of warping the query against each reference (as 
+			``timeWarp(query, reference)["cost"]``)
+		warpObj.backTraceCost : numpy 1D-array
+			The backtrace cost for each reference.  Only output if ``retPath = True``
+		warpObj.backTracePath : list
+			The backtrace path (numpy array) for each reference.  Only output if 
+			``retPath = True``
+		warpObj.warpStats : list
+			The warp statistics object for each reference - see ``timeWarp()``.  Only 
+			output if ``retPath = True``
+
+	Notes
+	-----
+	* As with ``timeWarp()``, the query and each reference are clipped to the length of the shorter one.
 	'''
-	n = len(x)
-	m = len(y)
+	erp = False
+	ERPg = 0
+	if method == 'ERP':
+		erp = True
+		if 'ERPg' in kwargs:
+			ERPg = kwargs['ERPg']
+	elif method != 'DTW':
+		print("timeWarpMany error - incorrect warp method specified:", method)
+		return -1
 
-	costMat = np.zeros((n,m))
+	metricName = metric
+	metric = _getMetric(metric)
+	if metric is None:
+		print("timeWarpMany error - incorrect metric specified:", metricName)
+		return -1
 
-	costMat[0,0] = dist[0,0]
+	query = np.ascontiguousarray(query, dtype=np.float64)
 
-	# Fill the edges
-	for i in range(1, n):
-		costMat[0,i] = dist[0,i] + costMat[0,i-1]
+	# Pack the references into one array
+	if isinstance(references, np.ndarray) and references.ndim == 2:
+		refs = np.ascontiguousarray(references, dtype=np.float64).ravel()
+		offsets = np.arange(len(references) + 1, dtype=np.int64) * references.shape[1]
+	else:
+		refs = np.concatenate([np.asarray(r, dtype=np.float64) for r in references])
+		offsets = np.zeros(len(references) + 1, dtype=np.int64)
+		offsets[1:] = np.cumsum([len(r) for r in references])
 
-	for i in range(1, n):
-		costMat[i,0] = dist[i,0] + costMat[i-1,0]
+	warpObj = {}
 
-	# Fill the rest of the matrix
-	for i in range(1, n):
-		for j in range(1, n):
-			minMove = min(costMat[i-1,j-1], costMat[i-1,j], costMat[i,j-1])
-			costMat[i,j] = minMove + dist[i,j]
+	if retPath == False:
+		warpObj["cost"] = _warpMany(query,refs,offsets,window,erp,ERPg,metric)
+		return warpObj
 
-	# Apply warp window
-	if w != 0:
-		for i in range(0, n):
-			for j in range(0, n):
-				if abs(i-j) >= w:
-					costMat[i,j] = np.inf
+	costs, backTraceCosts, paths, pathOffsets, counters = _warpManyPaths(query,refs,offsets,window,erp,ERPg,metric)
 
-	return costMat
+	warpObj["cost"] = costs
+	warpObj["backTraceCost"] = backTraceCosts
+	warpObj["backTracePath"] = [paths[pathOffsets[r]:pathOffsets[r+1]] for r in range(len(costs))]
+	warpObj["warpStats"] = [_warpStats(*c) for c in counters]
 
-def backTrace(costMat,dist):
-	'''Finds the optimal warping path by backtracking through the cost matrix.
+	return warpObj
 
-	Parameters
-	----------
-		dist : list
-			A matrix (list of lists) describing the L1-distance matrix between two 
-			time series.  For a time series of length n, this matrix must be of size n x n.
-		costMat : list
-			A matrix (list of lists) describing the time-warped cost matrix between two 
-			time series.  For a time series of length n, this matrix must be of size n x n.
 
-	Returns
-	-------
-		path : list
-			List of pairs of coordinates in time-space describing the backtrace through
-			the cost matrix
+@jit(parallel=True)
+def _warpMany(query,refs,offsets,w,erp,g,metric):
+	'''Compiled cost of warping a query against each of a set of packed 
+	references (see ``timeWarpMany()``).
+	'''
+	costs = np.empty(len(offsets) - 1)
+
+	for r in prange(len(offsets) - 1):
+		n = min(len(query), offsets[r+1] - offsets[r])
+		lo, hi = warpLimits(n,n,w)
+		costs[r] = warpCost(query[0:n],refs[offsets[r]:offsets[r]+n],lo,hi,erp,g,metric)
+
+	return costs
+
+
+@jit(parallel=True)
+def _warpManyPaths(query,refs,offsets,w,erp,g,metric):
+	'''Compiled cost and backtrace of warping a query against each of a set of
+	packed references (see ``timeWarpMany()``).  The paths are written into one
+	array, with the path for reference r starting at ``pathOffsets[r]``.
+	'''
+	N = len(offsets) - 1
+
+	costs = np.empty(N)
+	backTraceCosts = np.empty(N)
+	counters = np.zeros((N,5), dtype=np.int64)
+
+	# Space for the longest possible path of each reference
+	pathSpace = np.zeros(N + 1, dtype=np.int64)
+	for r in range(N):
+		n = min(len(query), offsets[r+1] - offsets[r])
+		pathSpace[r+1] = pathSpace[r] + max(2 * n - 1, 0)
+
+	paths = np.empty((pathSpace[N],2), dtype=np.int32)
+	pathLengths = np.zeros(N, dtype=np.int64)
+
+	for r in prange(N):
+		n = min(len(query), offsets[r+1] - offsets[r])
+		x = query[0:n]
+		y = refs[offsets[r]:offsets[r]+n]
+
+		lo, hi = warpLimits(n,n,w)
+		start = bandOffsets(lo,hi)
+		cost, costBand, dirBand = warpBand(x,y,lo,hi,start,erp,g,False,metric)
+		path, backTraceCost, counter = _backTraceDir(dirBand,x,y,lo,hi,start,metric)
+
+		costs[r] = cost
+		backTraceCosts[r] = backTraceCost
+		paths[pathSpace[r]:pathSpace[r] + len(path)] = path
+		pathLengths[r] = len(path)
+		for c in range(5):
+			counters[r,c] = counter[c]
+
+	# Close up the unused space
+	pathOffsets = np.zeros(N + 1, dtype=np.int64)
+	for r in range(N):
+		pathOffsets[r+1] = pathOffsets[r] + pathLengths[r]
+		paths[pathOffsets[r]:pathOffsets[r+1]] = paths[pathSpace[r]:pathSpace[r] + pathLengths[r]]
+
+	return costs, backTraceCosts, paths[0:pathOffsets[N]], pathOffsets, counters
+
+
+def pairwiseWarp(series,method='DTW',window=0,metric='L1',**kwargs):
+	'''Calculates the warp cost between every pair of a set of time series, for 
+	clustering.  Only the costs are calculated (using memory proportional to the 
+	length of the series for each pair), and the pairs are spread across all of 
+	the available processor cores.
+
+	Parameters
+	----------
+		series : list or numpy 2D-array
+			The time series.  A list may contain series of different lengths.
+		method : str
+			Time warping method ``{'DTW','ERP'}``
+		window : int
+			Time warping window constraint (default = 0)
+		metric : str or function
+			Distance metric - see ``timeWarp()`` (default = 'L1')
+		ERPg :	int
+			g-value (for ``method = 'ERP'`` only)
+
+	Returns
+	-------
+		costs : numpy 1D-array
+			The warp cost of each pair of series, as a condensed distance matrix 
+			(the upper triangle, row by row).  This is the form used by 
+			``scipy.spatial.distance.squareform()`` and 
+			``scipy.cluster.hierarchy.linkage()``.
+
+	Notes
+	-----
+	* As the DTW and ERP costs are symmetric, only one warp is calculated for each pair.
+
+	* As with ``timeWarp()``, each pair of series is clipped to the length of the shorter one.
+	'''
+	erp = False
+	ERPg = 0
+	if method == 'ERP':
+		erp = True
+		if 'ERPg' in kwargs:
+			ERPg = kwargs['ERPg']
+	elif method != 'DTW':
+		print("pairwiseWarp error - incorrect warp method specified:", method)
+		return -1
+
+	metricName = metric
+	metric = _getMetric(metric)
+	if metric is None:
+		print("pairwiseWarp error - incorrect metric specified:", metricName)
+		return -1
+
+	# Pack the series into one array
+	if isinstance(series, np.ndarray) and series.ndim == 2:
+		packed = np.ascontiguousarray(series, dtype=np.float64).ravel()
+		offsets = np.arange(len(series) + 1, dtype=np.int64) * series.shape[1]
+	else:
+		packed = np.concatenate([np.asarray(x, dtype=np.float64) for x in series])
+		offsets = np.zeros(len(series) + 1, dtype=np.int64)
+		offsets[1:] = np.cumsum([len(x) for x in series])
+
+	return _warpPairs(packed,offsets,window,erp,ERPg,metric)
+
+
+@jit(parallel=True)
+def _warpPairs(packed,offsets,w,erp,g,metric):
+	'''Compiled warp cost of each pair of packed time series (see 
+	``pairwiseWarp()``).  The pairs are shared out by their position in the 
+	condensed matrix, so each core gets a similar amount of work.
+	'''
+	N = len(offsets) - 1
+	costs = np.empty(N * (N - 1) // 2)
+
+	for p in prange(N * (N - 1) // 2):
+		i, j = _condensedPair(p,N)
+
+		n = min(offsets[i+1] - offsets[i], offsets[j+1] - offsets[j])
+		lo, hi = warpLimits(n,n,w)
+		costs[p] = warpCost(packed[offsets[i]:offsets[i]+n],packed[offsets[j]:offsets[j]+n],lo,hi,erp,g,metric)
+
+	return costs
+
+
+@jit
+def _condensedPair(p,N):
+	'''Finds the pair (i, j), with i < j, at position p of an N x N condensed 
+	distance matrix.
+	'''
+	# Row i starts at position i * (2N - i - 1) / 2
+	i = int(N - 2 - np.floor(np.sqrt(-8.0 * p + 4.0 * N * (N - 1) - 7) / 2 - 0.5))
+
+	# Correct any rounding of the square root
+	while i > 0 and i * (2 * N - i - 1) // 2 > p:
+		i -= 1
+	while (i + 1) * (2 * N - i - 2) // 2 <= p:
+		i += 1
+
+	j = p - i * (2 * N - i - 1) // 2 + i + 1
+
+	return i, j
+
+
+def L1distances(a,b,dtype=np.float64):
+	'''Calcluates the L1 distance matrix between two time series.  For series with 
+	more than one channel, the distances of the channels are added together.
+
+	Parameters
+	----------
+		a : list
+			First time series, which will be compared against time series b.  A 2D 
+			array (or list of lists) has one row per time period and one column per
+			channel.
+		b : list
+			Second time series (reference)
+		dtype : numpy dtype
+			Type of the distance matrix, ``np.float64`` or ``np.float32``
+			(default = np.float64)
+
+	Returns
+	-------
+		distance : list
+			A matrix (list of lists) describing the L1-distance matrix between the two 
+			time series.  For a series of length n, this matrix will be of size n x n.  
+	'''
+	return _distMatrix(_channels(a),_channels(b),_L1,dtype)
+
+
+def distances(a,b,metric='L1',dtype=np.float64):
+	'''Calculates the distance matrix between two time series, using any metric in
+	the registry (see ``registerMetric()``).
+
+	Parameters
+	----------
+		a : list or numpy 1D-array
+			First time series, which will be compared against time series b.  A 2D 
+			array (or list of lists) has one row per time period and one column per
+			channel.
+		b : list or numpy 1D-array
+			Second time series (reference)
+		metric : str or function
+			Distance metric - see ``timeWarp()`` (default = 'L1')
+		dtype : numpy dtype
+			Type of the distance matrix, ``np.float64`` or ``np.float32`` 
+			(default = np.float64)
+
+	Returns
+	-------
+		distance : numpy 2D-array
+			The n x m distance matrix between the two time series
+	'''
+	metricName = metric
+	metric = _getMetric(metric)
+	if metric is None:
+		print("distances error - incorrect metric specified:", metricName)
+		return -1
+
+	return _distMatrix(_channels(a),_channels(b),metric,dtype)
+
+
+@jit
+def _distMatrix(a,b,metric,dtype=np.float64):
+	'''Compiled distance matrix between two time series, with one row per time 
+	period and one column per channel (see ``distances()``).
+	'''
+	n = len(a)
+	m = len(b)
+
+	distance = np.empty((n,m), dtype=dtype)
+
+	for i in range(n):
+		for j in range(m):
+			distance[i,j] = metric(a,b,i,j)
+
+	return distance 
+
+
+def _channels(a):
+	'''Returns a time series as a contiguous array with one row per time period
+	and one column per channel, so each period's channels are next to each other
+	in memory.
+	'''
+	a = np.asarray(a)
+
+	if a.ndim == 1:
+		a = a.reshape(-1,1)
+
+	return np.ascontiguousarray(a)
+
+
+@jit
+def _L1(x,y,i,j):
+	'''L1 distance between period i of x and period j of y, summed over channels.
+	Single channel series may also be passed as 1D-arrays.
+	'''
+	if x.ndim == 1:
+		return abs(x[i] - y[j])
+
+	d = 0.0
+	for c in range(x.shape[1]):
+		d += abs(x[i,c] - y[j,c])
+
+	return d
+
+
+@jit
+def _L2(x,y,i,j):
+	'''Euclidean (L2) distance between period i of x and period j of y.
+	'''
+	return np.sqrt(_sqEuclidean(x,y,i,j))
+
+
+@jit
+def _sqEuclidean(x,y,i,j):
+	'''Squared Euclidean distance between period i of x and period j of y.
+	'''
+	if x.ndim == 1:
+		return (x[i] - y[j]) ** 2
+
+	d = 0.0
+	for c in range(x.shape[1]):
+		d += (x[i,c] - y[j,c]) ** 2
+
+	return d
+
+
+@jit
+def _chebyshev(x,y,i,j):
+	'''Chebyshev distance (largest distance of any channel) between period i of
+	x and period j of y.
+	'''
+	if x.ndim == 1:
+		return abs(x[i] - y[j])
+
+	d = 0.0
+	for c in range(x.shape[1]):
+		d = max(d, abs(x[i,c] - y[j,c]))
+
+	return d
+
+
+@jit
+def _gapPoint(x,g):
+	'''A single time period with every channel equal to the ERP g-value, so the
+	distance of a period from the gap can be found with any metric.
+	'''
+	gap = np.empty(x[0:1].shape)
+	gap[:] = g
+
+	return gap
+
+
+# Registry of the distance metrics, by name
+metrics = {
+	'L1': _L1,
+	'L2': _L2,
+	'sqeuclidean': _sqEuclidean,
+	'chebyshev': _chebyshev,
+}
+
+# Compiled versions of the metric functions passed in directly
+_compiledMetrics = {}
+
+
+def registerMetric(name,metric):
+	'''Adds a distance metric to the registry, so it can be chosen by name (e.g.
+	``timeWarp(a, b, metric=name)``).
+
+	The metric is compiled with ``@jit``, and the warp functions are compiled 
+	separately for each metric the first time it is used, with the metric 
+	inlined into the cost calculation.  The compiled versions are kept, so 
+	later calls with the same metric run at full speed.
+
+	Parameters
+	----------
+		name : str
+			Name of the metric
+		metric : function
+			Function ``metric(x, y, i, j)`` returning the distance between period i
+			of time series x and period j of time series y.  x and y are numpy 
+			1D-arrays for single channel series, or 2D-arrays with one row per 
+			time period and one column per channel.
+
+	Returns
+	-------
+		metric : function
+			The compiled metric
+	'''
+	metrics[name] = _compileMetric(metric)
+
+	return metrics[name]
+
+
+def _compileMetric(metric):
+	'''Returns the compiled version of a metric function, compiling it the first
+	time it is seen.
+	'''
+	if hasattr(metric, 'py_func') or backend != 'numba':
+		return metric
+
+	if metric not in _compiledMetrics:
+		_compiledMetrics[metric] = jit(metric)
+
+	return _compiledMetrics[metric]
+
+
+def _getMetric(metric):
+	'''Finds a metric by name in the registry, or compiles a metric function.  
+	Returns None if the metric is not found.
+	'''
+	if isinstance(metric, str):
+		return metrics.get(metric)
+
+	if callable(metric):
+		return _compileMetric(metric)
+
+	return None
+
+
+@jit
+def ERPwarp(dist,x,y,w=0,g=0,dtype=np.float64,ub=np.inf):
+	'''Calcluates the ERP cost matrix between two time series.
+
+	Parameters
+	----------
+		dist : list
+			A matrix (list of lists) describing the L1-distance matrix between two 
+			time series.  For a time series of length n, this matrix must be of size n x n.
+		x : list
+			First time series, which will be compared against time series y
+		y : list 
+			Second time series (reference)
+		w : int
+			Time warping window constraint (default = 0)
+		g :	int
+			ERP g-value (deafult = 0)
+		dtype : numpy dtype
+			Type of the cost matrix, ``np.float64`` or ``np.float32`` 
+			(default = np.float64)
+		ub : float
+			Upper bound on the cost.  The calculation stops once every cell of a row
+			costs more than this, leaving the remaining rows (and so the cost) set to
+			infinity (default = infinity, never stopped)
+
+	Returns
+	-------
+		costMat : list
+			A matrix (list of lists) describing the ERP cost matrix between the two time 
+			series.  For a series of length n, this matrix will be of size n x n.  Cells
+			outside of the warp window are not calculated and are set to infinity.
+	'''
+	n = len(x)
+	m = len(y)
+
+	costMat = np.full((n,m), np.inf, dtype=dtype)
+
+	for i in range(n):
+		# Only visit the cells inside the warp window
+		jLo = 0
+		jHi = m
+		if w != 0:
+			jLo = max(0, i - w + 1)
+			jHi = min(m, i + w)
+
+		for j in range(jLo, jHi):
+			if i == 0 and j == 0:
+				costMat[0,0] = dist[0,0]
+			elif i == 0:
+				# Fill the edges
+				costMat[0,j] = costMat[0,j-1] + abs(dist[0,j] - g)
+			elif j == 0:
+				costMat[i,0] = costMat[i-1,0] + abs(dist[i,0] - g)
+			else:
+				OpMatch = costMat[i-1,j-1] + dist[i,j]
+				OpIns = costMat[i-1,j] + abs(x[i] - g)
+				OpDel = costMat[i,j-1] + abs(y[j] - g)
+
+				costMat[i,j] = min(OpMatch,OpDel,OpIns)
+
+		# Every path crosses this row, so the cost is higher than the bound
+		if ub < np.inf and costMat[i,jLo:jHi].min() > ub:
+			break
+
+	return costMat
+
+
+@jit
+def DTWwarp(dist,x,y,w=0,dtype=np.float64,ub=np.inf):
+	'''Calcluates the DTW cost matrix between two time series.
+
+	Parameters
+	----------
+		dist : list
+			A matrix (list of lists) describing the L1-distance matrix between two 
+			time series.  For a time series of length n, this matrix must be of size n x n.
+		x : list
+			First time series, which will be compared against time series y
+		y : list 
+			Second time series (reference)
+		w : int
+			Time warping window constraint (default = 0)
+		dtype : numpy dtype
+			Type of the cost matrix, ``np.float64`` or ``np.float32`` 
+			(default = np.float64)
+		ub : float
+			Upper bound on the cost.  The calculation stops once every cell of a row
+			costs more than this, leaving the remaining rows (and so the cost) set to
+			infinity (default = infinity, never stopped)
+
+	Returns
+	-------
+		costMat : list
+			A matrix (list of lists) describing the DTW cost matrix between the two time 
+			series.  For a series of length n, this matrix will be of size n x n.  Cells
+			outside of the warp window are not calculated and are set to infinity.
+	'''
+	n = len(x)
+	m = len(y)
+
+	costMat = np.full((n,m), np.inf, dtype=dtype)
+
+	for i in range(n):
+		# Only visit the cells inside the warp window
+		jLo = 0
+		jHi = m
+		if w != 0:
+			jLo = max(0, i - w + 1)
+			jHi = min(m, i + w)
+
+		for j in range(jLo, jHi):
+			if i == 0 and j == 0:
+				costMat[0,0] = dist[0,0]
+			elif i == 0:
+				# Fill the edges
+				costMat[0,j] = dist[0,j] + costMat[0,j-1]
+			elif j == 0:
+				costMat[i,0] = dist[i,0] + costMat[i-1,0]
+			else:
+				minMove = min(costMat[i-1,j-1], costMat[i-1,j], costMat[i,j-1])
+				costMat[i,j] = minMove + dist[i,j]
+
+		# Every path crosses this row, so the cost is higher than the bound
+		if ub < np.inf and costMat[i,jLo:jHi].min() > ub:
+			break
+
+	return costMat
+
+
+@jit
+def warpLimits(n,m,w=0):
+	'''Calculates the Sakoe-Chiba warp window as a range of allowed columns for
+	each row of the cost matrix.
+
+	Parameters
+	----------
+		n : int
+			Length of the first time series (rows of the cost matrix)
+		m : int
+			Length of the second time series (columns of the cost matrix)
+		w : int
+			Time warping window constraint (default = 0, i.e. no window)
+
+	Returns
+	-------
+		lo : numpy 1D-array
+			First column inside the window, for each row
+		hi : numpy 1D-array
+			Last column inside the window, for each row
+	'''
+	rows = np.arange(n, dtype=np.int64)
+
+	if w == 0:
+		lo = np.zeros(n, dtype=np.int64)
+		hi = np.full(n, m - 1, dtype=np.int64)
+	else:
+		lo = np.maximum(rows - w + 1, 0)
+		hi = np.minimum(rows + w - 1, m - 1)
+
+	return lo, hi
+
+
+@jit
+def bandOffsets(lo,hi):
+	'''Calculates where each row of a warp band starts in the flat band storage.
+	Row i of the band holds the cells (i, lo[i]) to (i, hi[i]), so cell (i, j) is
+	stored at ``start[i] + j - lo[i]``.
+
+	Parameters
+	----------
+		lo : numpy 1D-array
+			First column inside the window, for each row (see ``warpLimits()``)
+		hi : numpy 1D-array
+			Last column inside the window, for each row
+
+	Returns
+	-------
+		start : numpy 1D-array
+			Offset of each row in the band storage.  The final entry (``start[n]``) 
+			is the total number of cells in the band.
+	'''
+	start = np.zeros(len(lo) + 1, dtype=np.int64)
+	start[1:] = np.cumsum(np.maximum(hi - lo + 1, 0))
+
+	return start
+
+
+def itakuraLimits(n,m,slope=2):
+	'''Calculates the Itakura parallelogram global constraint as a range of 
+	allowed columns for each row of the cost matrix.  Warp paths inside the 
+	parallelogram have an average slope between ``1/slope`` and ``slope`` from 
+	both the start and the end of the cost matrix.
+
+	Parameters
+	----------
+		n : int
+			Length of the first time series (rows of the cost matrix)
+		m : int
+			Length of the second time series (columns of the cost matrix)
+		slope : float
+			Steepest slope allowed (default = 2, must be greater than 1)
+
+	Returns
+	-------
+		lo : numpy 1D-array
+			First column inside the parallelogram, for each row
+		hi : numpy 1D-array
+			Last column inside the parallelogram, for each row
+	'''
+	rows = np.arange(n, dtype=np.float64)
+	remain = (n - 1) - rows
+
+	lo = np.maximum(np.ceil(rows / slope), (m - 1) - np.floor(remain * slope))
+	hi = np.minimum(np.floor(rows * slope), (m - 1) - np.ceil(remain / slope))
+
+	lo = np.clip(lo, 0, m - 1).astype(np.int64)
+	hi = np.clip(hi, 0, m - 1).astype(np.int64)
+
+	return lo, hi
+
+
+def checkLimits(lo,hi,m):
+	'''Checks that a range of allowed columns for each row of the cost matrix 
+	(e.g. from ``warpLimits()`` or ``itakuraLimits()``) contains a warp path.
+
+	Parameters
+	----------
+		lo : numpy 1D-array
+			First allowed column, for each row
+		hi : numpy 1D-array
+			Last allowed column, for each row
+		m : int
+			Length of the second time series (columns of the cost matrix)
+
+	Returns
+	-------
+		problem : str
+			Description of the problem, or None if the limits are valid
+	'''
+	if len(lo) != len(hi):
+		return "lo and hi must be the same length"
+	if len(lo) == 0:
+		return "no rows allowed"
+	if lo[0] != 0 or hi[-1] != m - 1:
+		return "the first and last cells of the cost matrix must be allowed"
+	if np.any(lo > hi):
+		return "every row must have at least one allowed column"
+	if np.any(np.diff(lo) < 0) or np.any(np.diff(hi) < 0):
+		return "lo and hi must not decrease from one row to the next"
+	if np.any(lo[1:] > hi[:-1] + 1):
+		return "the allowed cells of each row must touch the row before"
+
+	return None
+
+
+def fastWarpLimits(a,b,radius=1,metric=_L1):
+	'''Calculates an approximate warp window using the FastDTW method.  The time 
+	series are recursively coarsened by averaging pairs of points, warped at the 
+	coarsest level, and the warp path is then projected onto each finer level and 
+	widened by ``radius`` cells to give the window searched at that level.  Time 
+	and memory are proportional to the length of the series.
+
+	Parameters
+	----------
+		a : numpy 1D or 2D-array
+			First time series, which will be compared against time series b, with 
+			one row per time period and one column per channel
+		b : numpy 1D or 2D-array
+			Second time series (reference), with the same channels as a
+		radius : int
+			Number of cells the projected path is widened by at each level 
+			(default = 1).  Larger values give a closer approximation to DTW.
+		metric : function
+			Compiled distance metric (default = L1) - see ``registerMetric()``
+
+	Returns
+	-------
+		lo : numpy 1D-array
+			First column inside the window, for each row
+		hi : numpy 1D-array
+			Last column inside the window, for each row
+	'''
+	n = len(a)
+	m = len(b)
+
+	# Short series are warped without a window
+	if n <= radius + 2 or m <= radius + 2:
+		return warpLimits(n,m,0)
+
+	ac = _coarsen(a)
+	bc = _coarsen(b)
+
+	lo, hi = fastWarpLimits(ac,bc,radius,metric)
+	start = bandOffsets(lo,hi)
+
+	cost, costBand, dirBand = warpBand(ac,bc,lo,hi,start,False,0,False,metric)
+	path, backTraceCost, counters = _backTraceDir(dirBand,ac,bc,lo,hi,start,metric)
+
+	return _projectPath(path,n,m,radius)
+
+
+def _coarsen(a):
+	'''Halves the resolution of a time series (one row per time period) by 
+	averaging pairs of points.
+	'''
+	n = len(a)
+	coarse = np.asarray(a[0:n - n % 2], dtype=np.float64).reshape((n // 2,2) + a.shape[1:]).mean(axis=1)
+
+	if n % 2 == 1:
+		coarse = np.concatenate((coarse, a[n-1:n]))
+
+	return coarse
+
+
+@jit
+def _projectPath(path,n,m,radius):
+	'''Projects a warp path onto a time series of twice the resolution, and 
+	widens it by radius cells to give the warp window at the finer level.
+	'''
+	pathLo = np.full(n, m, dtype=np.int64)
+	pathHi = np.full(n, -1, dtype=np.int64)
+
+	for k in range(len(path)):
+		for i in range(2 * path[k,0], min(2 * path[k,0] + 2, n)):
+			pathLo[i] = min(pathLo[i], 2 * path[k,1])
+			pathHi[i] = max(pathHi[i], min(2 * path[k,1] + 1, m - 1))
+
+	lo = np.empty(n, dtype=np.int64)
+	hi = np.empty(n, dtype=np.int64)
+
+	for i in range(n):
+		jLo = m
+		jHi = -1
+		for r in range(max(0, i - radius), min(n, i + radius + 1)):
+			jLo = min(jLo, pathLo[r])
+			jHi = max(jHi, pathHi[r])
+
+		lo[i] = max(0, jLo - radius)
+		hi[i] = min(m - 1, jHi + radius)
+
+	return lo, hi
+
+
+# Direction codes recorded by the forward pass, giving the previous cell
+# on the warp path
+DIR_START = 0
+DIR_DIAG = 1
+DIR_UP = 2
+DIR_LEFT = 3
+
+# Rows and columns of each tile of the cost matrix filled by warpTiled(), and 
+# the number of cells in a band above which timeWarp() uses warpTiled()
+TILE_SIZE = 256
+TILED_CELLS = 2 ** 22
+
+# Number of cells of a memory-mapped cost matrix read into memory at once by 
+# the backtrace
+MAPPED_CELLS = 2 ** 22
+
+# Number of cells in a block below which warpLinear() stores the backtrace 
+# directions of the block, rather than splitting it in two
+LINEAR_CELLS = 2 ** 16
+
+
+@jit
+def _bandCells(lo,hi,rows):
+	'''Number of cells in the first rows of a warp band.
+	'''
+	total = 0
+	for i in range(rows):
+		total += hi[i] - lo[i] + 1
+
+	return total
+
+
+@jit
+def _warpCell(x,y,i,j,d,diag,up,left,gap,erp,g,metric):
+	'''Cost of cell (i, j) of the DTW or ERP cost matrix, from its distance d and
+	the costs of its neighbours (infinity outside of the warp window).  gap is 
+	the ERP gap point (see ``_gapPoint()``).  Used by all of the cost matrix 
+	calculations, so they give the same costs.
+	'''
+	if i == 0 and j == 0:
+		return d
+
+	if erp:
+		if i == 0 or j == 0:
+			# Edges are a running sum of the penalised distance
+			return min(up, left) + abs(d - g)
+
+		return min(diag + d, up + metric(x,gap,i,0), left + metric(y,gap,j,0))
+
+	return min(diag, up, left) + d
+
+
+@jit
+def _warpMove(i,j,diag,up,left):
+	'''Step that the backtrace takes out of cell (i, j), from the costs of its 
+	neighbours.  Between steps of equal cost, up is chosen first, then left, then
+	diagonal, as in ``backTrace()``.
+	'''
+	if i == 0 and j == 0:
+		return DIR_START
+	if i == 0:
+		return DIR_LEFT
+	if j == 0:
+		return DIR_UP
+
+	minMove = min(diag, up, left)
+	if up == minMove:
+		return DIR_UP
+	if left == minMove:
+		return DIR_LEFT
+
+	return DIR_DIAG
+
+
+@jit
+def warpBand(x,y,lo,hi,start,erp=False,g=0,retCost=True,metric=_L1,dtype=np.float64,ub=np.inf,cells=None):
+	'''Calculates the DTW or ERP cost matrix between two time series, for the 
+	cells inside the warp window only.  Memory and time are proportional to the 
+	number of cells in the band, rather than n x m.  The distances are 
+	calculated as they are needed, so no distance matrix is built.
+
+	The direction of the backtrace step out of each cell is recorded as a single
+	byte (see ``backTraceBand()``), using the same choice of step as ``backTrace()``.
+
+	Parameters
+	----------
+		x : numpy 1D or 2D-array
+			First time series, which will be compared against time series y, with 
+			one row per time period and one column per channel
+		y : numpy 1D or 2D-array
+			Second time series (reference), with the same channels as x
+		lo, hi, start : numpy 1D-array
+			The warp band (see ``warpLimits()`` and ``bandOffsets()``)
+		erp : bool
+			Calculate the ERP cost matrix instead of DTW (default = False)
+		g :	int
+			ERP g-value (deafult = 0)
+		retCost : bool
+			Whether to keep the full cost band.  If False, only two rolling rows of
+			the cost matrix are kept, and only the directions are stored for every 
+			cell (default = True)
+		metric : function
+			Compiled distance metric (default = L1) - see ``registerMetric()``
+		dtype : numpy dtype
+			Type of the cost matrix, ``np.float64`` or ``np.float32`` 
+			(default = np.float64)
+		ub : float
+			Upper bound on the cost.  The calculation stops once every cell of a row
+			costs more than this, and the cost is returned as infinity (default = 
+			infinity, never stopped)
+		cells : numpy 1D-array
+			Optional 1-element array, which is set to the number of cells of the 
+			cost matrix calculated (fewer than the band if the calculation stopped 
+			at ub, default = None)
+
+	Returns
+	-------
+		cost : float
+			Bottom left value of the cost matrix
+		costBand : numpy 1D-array
+			The cost matrix cells in the band, in band storage order (or the two 
+			rolling rows, if ``retCost = False``)
+		dirBand : numpy 1D-array
+			The backtrace direction codes of the cells in the band, in band 
+			storage order
+	'''
+	n = len(x)
+	m = len(y)
+
+	if retCost:
+		costBand = np.empty(start[n], dtype=dtype)
+	else:
+		costBand = np.empty(2 * m, dtype=dtype)
+
+	dirBand = np.empty(start[n], dtype=np.uint8)
+	gap = _gapPoint(x,g)
+
+	base = 0
+	for i in range(n):
+		# Window of the previous row (empty for the first row)
+		loPrev = 0
+		hiPrev = -1
+		basePrev = base
+		if i > 0:
+			loPrev = lo[i-1]
+			hiPrev = hi[i-1]
+
+		# Cell (i, j) of the cost matrix is stored at base + j
+		if retCost:
+			base = start[i] - lo[i]
+		else:
+			base = (i % 2) * m
+
+		for j in range(lo[i], hi[i] + 1):
+			k = start[i] + j - lo[i]
+			d = metric(x,y,i,j)
+
+			# Cells outside the window cost infinity
+			diag = np.inf
+			up = np.inf
+			left = np.inf
+			if loPrev <= j - 1 <= hiPrev:
+				diag = costBand[basePrev + j - 1]
+			if loPrev <= j <= hiPrev:
+				up = costBand[basePrev + j]
+			if j > lo[i]:
+				left = costBand[base + j - 1]
+
+			costBand[base + j] = _warpCell(x,y,i,j,d,diag,up,left,gap,erp,g,metric)
+
+			# Step that the backtrace will take out of this cell
+			dirBand[k] = _warpMove(i,j,diag,up,left)
+
+		# Every path crosses this row, so the cost is higher than the bound
+		if ub < np.inf and costBand[base + lo[i]:base + hi[i] + 1].min() > ub:
+			if cells is not None:
+				cells[0] = start[i+1]
+			return np.inf, costBand, dirBand
+
+	if cells is not None:
+		cells[0] = start[n]
+
+	cost = np.inf
+	if lo[n-1] <= m - 1 <= hi[n-1]:
+		cost = costBand[base + m - 1]
+
+	return cost, costBand, dirBand
+
+
+@jit
+def warpCost(x,y,lo,hi,erp=False,g=0,metric=_L1,dtype=np.float64,ub=np.inf,cells=None):
+	'''Calculates only the DTW or ERP cost between two time series, without 
+	storing the cost matrix.  Two rolling rows are kept, so memory use is 
+	proportional to the length of the series, and no warp path is available.
+
+	Parameters
+	----------
+		x : numpy 1D or 2D-array
+			First time series, which will be compared against time series y, with 
+			one row per time period and one column per channel
+		y : numpy 1D or 2D-array
+			Second time series (reference), with the same channels as x
+		lo, hi : numpy 1D-array
+			The warp window for each row (see ``warpLimits()``)
+		erp : bool
+			Calculate the ERP cost instead of DTW (default = False)
+		g :	int
+			ERP g-value (deafult = 0)
+		metric : function
+			Compiled distance metric (default = L1) - see ``registerMetric()``
+		dtype : numpy dtype
+			Type of the cost matrix, ``np.float64`` or ``np.float32`` 
+			(default = np.float64)
+		ub : float
+			Upper bound on the cost, e.g. the best cost found so far in a search.  
+			The calculation stops once every cell of a row costs more than this, and
+			infinity is returned (default = infinity, never stopped)
+		cells : numpy 1D-array
+			Optional 1-element array, which is set to the number of cells of the 
+			cost matrix calculated (fewer than the band if the calculation stopped 
+			at ub, default = None)
+
+	Returns
+	-------
+		cost : float
+			Bottom left value of the cost matrix (infinity if the window does not 
+			reach it, or the calculation stopped at the upper bound)
+	'''
+	n = len(x)
+	m = len(y)
+
+	prev = np.empty(m, dtype=dtype)
+	cur = np.empty(m, dtype=dtype)
+	gap = _gapPoint(x,g)
+
+	for i in range(n):
+		# Window of the previous row (empty for the first row)
+		loPrev = 0
+		hiPrev = -1
+		if i > 0:
+			loPrev = lo[i-1]
+			hiPrev = hi[i-1]
+
+		for j in range(lo[i], hi[i] + 1):
+			d = metric(x,y,i,j)
+
+			# Cells outside the window cost infinity
+			diag = np.inf
+			up = np.inf
+			left = np.inf
+			if loPrev <= j - 1 <= hiPrev:
+				diag = prev[j-1]
+			if loPrev <= j <= hiPrev:
+				up = prev[j]
+			if j > lo[i]:
+				left = cur[j-1]
+
+			cur[j] = _warpCell(x,y,i,j,d,diag,up,left,gap,erp,g,metric)
+
+		# Every path crosses this row, so the cost is higher than the bound
+		if ub < np.inf and cur[lo[i]:hi[i] + 1].min() > ub:
+			if cells is not None:
+				cells[0] = _bandCells(lo,hi,i + 1)
+			return np.inf
+
+		prev, cur = cur, prev
+
+	if cells is not None:
+		cells[0] = _bandCells(lo,hi,n)
+
+	if lo[n-1] <= m - 1 <= hi[n-1]:
+		return prev[m-1]
+
+	return np.inf
+
+
+@jit(parallel=True)
+def warpTiled(x,y,lo,hi,start,erp=False,g=0,retCost=True,retDir=True,metric=_L1,tile=TILE_SIZE,dtype=np.float64,ub=np.inf,cells=None):
+	'''Calculates the DTW or ERP cost matrix over a warp band using several 
+	processor cores, for a single long alignment.  The cost matrix is split into
+	square tiles, which are filled one anti-diagonal of tiles at a time.  The 
+	tiles on an anti-diagonal only depend on the tiles above and to the left of 
+	them, so they are filled in parallel.
+
+	The results are the same as ``warpBand()`` (and ``warpCost()`` if only the 
+	cost is needed).  Only the last row and column of each tile are passed on to
+	the neighbouring tiles, in one row and one column of the cost matrix, so the
+	memory used is proportional to the length of the series unless the full 
+	cost band (``retCost = True``) or the directions (``retDir = True``) are 
+	stored.
+
+	Parameters
+	----------
+		x : numpy 1D or 2D-array
+			First time series, which will be compared against time series y, with 
+			one row per time period and one column per channel
+		y : numpy 1D or 2D-array
+			Second time series (reference), with the same channels as x
+		lo, hi, start : numpy 1D-array
+			The warp band (see ``warpLimits()`` and ``bandOffsets()``)
+		erp : bool
+			Calculate the ERP cost matrix instead of DTW (default = False)
+		g :	int
+			ERP g-value (deafult = 0)
+		retCost : bool
+			Whether to store the full cost band (default = True)
+		retDir : bool
+			Whether to record the backtrace direction of every cell (default = True)
+		metric : function
+			Compiled distance metric (default = L1) - see ``registerMetric()``
+		tile : int
+			Number of rows and columns in each tile (default = TILE_SIZE)
+		dtype : numpy dtype
+			Type of the cost matrix, ``np.float64`` or ``np.float32`` 
+			(default = np.float64)
+		ub : float
+			Upper bound on the cost.  Every path leaves the tiles filled so far 
+			through the last row or column of a tile on the latest anti-diagonal, 
+			or diagonally from the bottom right corner of a tile on the one before, 
+			so the calculation stops once all of those cells cost more than this, 
+			and the cost is returned as infinity (default = infinity, never stopped)
+		cells : numpy 1D-array
+			Optional 1-element array, which is set to the number of cells of the 
+			cost matrix calculated (fewer than the band if the calculation stopped 
+			at ub, default = None)
+
+	Returns
+	-------
+		cost : float
+			Bottom left value of the cost matrix (infinity if the window does not 
+			reach it)
+		costBand : numpy 1D-array
+			Cost of each cell in the band, in band storage order (empty if 
+			``retCost = False``)
+		dirBand : numpy 1D-array
+			Backtrace direction of each cell in the band, in band storage order 
+			(empty if ``retDir = False``)
+	'''
+	n = len(x)
+	m = len(y)
+
+	costBand = np.empty(start[n] if retCost else 0, dtype=dtype)
+	dirBand = np.empty(start[n] if retDir else 0, dtype=np.uint8)
+	gap = _gapPoint(x,g)
+
+	tileRows = (n + tile - 1) // tile
+	tileCols = (m + tile - 1) // tile
+
+	# Range of tile columns that the band passes through, for each row of tiles
+	tileLo = np.empty(tileRows, dtype=np.int64)
+	tileHi = np.empty(tileRows, dtype=np.int64)
+	for I in range(tileRows):
+		tileLo[I] = lo[I * tile] // tile
+		tileHi[I] = hi[min(n, (I + 1) * tile) - 1] // tile
+
+	# The last row of the latest tile in each column of tiles, and the last 
+	# column of the latest tile in each row of tiles.  The column starts with the
+	# cell above the tile, which the next tile to the right needs as its corner, 
+	# as the tile below may already have replaced it in lastRow
+	lastRow = np.full(m, np.inf, dtype=dtype)
+	lastCols = np.full((tileRows,tile + 1), np.inf, dtype=dtype)
+
+	tiles = np.empty(tileRows, dtype=np.int64)
+
+	# Lowest cost on the last row and column, the cost of the bottom right 
+	# corner and the number of cells in the band, of each tile on the 
+	# anti-diagonal
+	edgeMin = np.empty(tileRows, dtype=dtype)
+	corners = np.empty(tileRows, dtype=dtype)
+	tileCells = np.zeros(tileRows, dtype=np.int64)
+	cornerMin = np.inf
+	done = 0
+
+	for D in range(tileRows + tileCols - 1):
+		# Rows of tiles with a tile in the band on this anti-diagonal
+		count = 0
+		for I in range(max(0, D - tileCols + 1), min(tileRows, D + 1)):
+			if tileLo[I] <= D - I <= tileHi[I]:
+				tiles[count] = I
+				count += 1
+
+		for t in prange(count):
+			I = tiles[t]
+			J = D - I
+			i0 = I * tile
+			i1 = min(n, i0 + tile)
+			j0 = J * tile
+			j1 = min(m, j0 + tile)
+
+			# Costs of the tile, with the row above and the column to the left of
+			# it in row 0 and column 0 (infinity outside of the band)
+			local = np.full((tile + 1,tile + 1), np.inf, dtype=dtype)
+
+			if I > 0:
+				above = i0 - 1
+				for j in range(max(j0, lo[above]), min(j1 - 1, hi[above]) + 1):
+					local[0,j - j0 + 1] = lastRow[j]
+
+			if J > tileLo[I]:
+				for r in range(i1 - i0 + 1):
+					local[r,0] = lastCols[I,r]
+			elif I > 0 and lo[i0 - 1] <= j0 - 1 <= hi[i0 - 1]:
+				# No tile to the left, so the cell above it is still in lastRow
+				local[0,0] = lastRow[j0 - 1]
+
+			tileCells[t] = 0
+			for i in range(i0, i1):
+				r = i - i0 + 1
+				tileCells[t] += max(0, min(j1 - 1, hi[i]) - max(j0, lo[i]) + 1)
+				for j in range(max(j0, lo[i]), min(j1 - 1, hi[i]) + 1):
+					c = j - j0 + 1
+					k = start[i] + j - lo[i]
+					d = metric(x,y,i,j)
+
+					diag = local[r-1,c-1]
+					up = local[r-1,c]
+					left = local[r,c-1]
+
+					cost = _warpCell(x,y,i,j,d,diag,up,left,gap,erp,g,metric)
+					local[r,c] = cost
+					if retCost:
+						costBand[k] = cost
+
+					# Step that the backtrace will take out of this cell
+					if retDir:
+						dirBand[k] = _warpMove(i,j,diag,up,left)
+
+			# Pass on the last row and column of the tile
+			for j in range(j0, j1):
+				lastRow[j] = local[i1 - i0,j - j0 + 1]
+
+			for r in range(i1 - i0 + 1):
+				lastCols[I,r] = local[r,j1 - j0]
+
+			if ub < np.inf:
+				edgeMin[t] = min(local[i1 - i0,1:j1 - j0 + 1].min(), local[1:i1 - i0 + 1,j1 - j0].min())
+				corners[t] = local[i1 - i0,j1 - j0]
+
+		# Every path leaves the tiles filled so far through the edges of this 
+		# anti-diagonal of tiles, or a diagonal step from a corner of the last one
+		lowest = cornerMin
+		cornerMin = np.inf
+		for t in range(count):
+			done += tileCells[t]
+			if ub < np.inf:
+				lowest = min(lowest, edgeMin[t])
+				cornerMin = min(cornerMin, corners[t])
+
+		if ub < np.inf and count > 0 and lowest > ub:
+			if cells is not None:
+				cells[0] = done
+			return np.inf, costBand, dirBand
+
+	if cells is not None:
+		cells[0] = done
+
+	cost = np.inf
+	if lo[n-1] <= m - 1 <= hi[n-1]:
+		cost = lastRow[m - 1]
+
+	return cost, costBand, dirBand
+
+
+@jit
+def warpRows(x,y,lo,hi,costMat,distMat,erp=False,g=0,metric=_L1,ub=np.inf,cells=None):
+	'''Calculates the full DTW or ERP cost matrix and distance matrix between two
+	time series, writing them out one row at a time, with infinity outside of the
+	warp window.  Only two rows are held in memory, so the matrices can be
+	memory-mapped files (``np.memmap``) larger than the memory available.
+
+	Parameters
+	----------
+		x : numpy 1D or 2D-array
+			First time series, which will be compared against time series y, with 
+			one row per time period and one column per channel
+		y : numpy 1D or 2D-array
+			Second time series (reference), with the same channels as x
+		lo, hi : numpy 1D-array
+			First and last column of the warp window in each row (see 
+			``warpLimits()``)
+		costMat, distMat : numpy 2D-array
+			n x m arrays which the cost and distance matrices are written into.  The
+			costs are calculated in the type of costMat
+		erp : bool
+			Calculate the ERP cost matrix instead of DTW (default = False)
+		g :	int
+			ERP g-value (deafult = 0)
+		metric : function
+			Compiled distance metric (default = L1) - see ``registerMetric()``
+		ub : float
+			Upper bound on the cost.  The calculation stops once every cell of a row
+			costs more than this, leaving the remaining rows unwritten, and the 
+			cost is returned as infinity (default = infinity, never stopped)
+		cells : numpy 1D-array
+			Optional 1-element array, which is set to the number of cells of the 
+			cost matrix calculated (fewer than the band if the calculation stopped 
+			at ub, default = None)
+
+	Returns
+	-------
+		cost : float
+			Bottom left value of the cost matrix
+	'''
+	n = len(x)
+	m = len(y)
+
+	prev = np.full(m, np.inf, dtype=costMat.dtype)
+	row = np.full(m, np.inf, dtype=costMat.dtype)
+	dist = np.empty(m)
+	gap = _gapPoint(x,g)
+
+	for i in range(n):
+		for j in range(m):
+			dist[j] = metric(x,y,i,j)
+			distMat[i,j] = dist[j]
+
+		row[:] = np.inf
+		for j in range(lo[i], hi[i] + 1):
+			# Cells outside the window are infinity in the rows
+			diag = np.inf
+			up = np.inf
+			left = np.inf
+			if i > 0:
+				up = prev[j]
+				if j > 0:
+					diag = prev[j-1]
+			if j > lo[i]:
+				left = row[j-1]
+
+			row[j] = _warpCell(x,y,i,j,dist[j],diag,up,left,gap,erp,g,metric)
+
+		costMat[i,:] = row
+
+		# Every path crosses this row, so the cost is higher than the bound
+		if ub < np.inf and row[lo[i]:hi[i] + 1].min() > ub:
+			if cells is not None:
+				cells[0] = _bandCells(lo,hi,i + 1)
+			return np.inf
+
+		prev, row = row, prev
+
+	if cells is not None:
+		cells[0] = _bandCells(lo,hi,n)
+
+	return prev[m-1]
+
+
+def bandToDense(band,lo,hi,start,m):
+	'''Expands a band into a full n x m matrix, with infinity outside of the warp
+	window.
+	'''
+	n = len(lo)
+	dense = np.full((n,m), np.inf, dtype=band.dtype)
+
+	for i in range(n):
+		dense[i, lo[i]:hi[i] + 1] = band[start[i]:start[i+1]]
+
+	return dense
+
+def backTrace(costMat,dist):
+	'''Finds the optimal warping path by backtracking through the cost matrix.
+	A memory-mapped cost matrix (``np.memmap``) is read in blocks of rows, from
+	the bottom up, rather than all at once.
+
+	Parameters
+	----------
+		dist : list
+			A matrix (list of lists) describing the L1-distance matrix between two 
+			time series.  For a time series of length n, this matrix must be of size n x n.
+		costMat : list
+			A matrix (list of lists) describing the time-warped cost matrix between two 
+			time series.  For a time series of length n, this matrix must be of size n x n.
+
+	Returns
+	-------
+		path : list
+			List of pairs of coordinates in time-space describing the backtrace through
+			the cost matrix
 		backTraceCost : float
 			The sum cost of following the backtrace through the cost matrix
 		warpStats : dict
@@ -344,7 +2219,25 @@ def backTrace(costMat,dist):
 			This will give positive values if a is on average ahead of b and negative
 			values is a is on average behind b.
 	'''
-	
+	# Memory-mapped matrices are read in blocks of rows, rather than all at once
+	if isinstance(costMat, np.memmap):
+		path, backTraceCost, counters = _backTraceMapped(costMat,dist)
+	else:
+		costMat = np.asarray(costMat, dtype=np.float64)
+		dist = np.asarray(dist, dtype=np.float64)
+
+		path, backTraceCost, counters = _backTraceMat(costMat,dist)
+	warpStats = _warpStats(*counters)
+
+	return path, backTraceCost, warpStats
+
+
+@jit
+def _backTraceMat(costMat,dist):
+	'''Compiled backtrace through a full cost matrix (see ``backTrace()``).  The 
+	path is written into a preallocated buffer, as it can be at most n + m - 1 
+	steps long.
+	'''
 	timeAhead = 0
 	timeBehind = 0
 	timeSync = 0
@@ -352,10 +2245,13 @@ def backTrace(costMat,dist):
 	amountAhead = 0
 	amountBehind = 0
 
-	
-	i = len(costMat) - 1
-	j = len(costMat[0]) - 1
-	path = np.array([i,j])
+	i = costMat.shape[0] - 1
+	j = costMat.shape[1] - 1
+
+	path = np.empty((i + j + 1, 2), dtype=np.int32)
+	path[0,0] = i
+	path[0,1] = j
+	k = 1
 
 	backTraceCost = dist[i,j]
 
@@ -377,7 +2273,493 @@ def backTrace(costMat,dist):
 				j = j - 1
 		
 		backTraceCost += dist[i,j]
-		path = np.vstack([path,[i,j]])
+		path[k,0] = i
+		path[k,1] = j
+		k += 1
+
+		if j > i:
+			timeAhead += 1
+			amountAhead += j - i
+		elif i > j:
+			timeBehind += 1
+			amountBehind += i - j
+		else:
+			timeSync +=1
+
+	counters = (timeAhead,timeBehind,timeSync,amountAhead,amountBehind)
+
+	return path[:k], backTraceCost, counters
+
+
+def _backTraceMapped(costMat,dist,lo=None):
+	'''Backtrace through a memory-mapped cost matrix (see ``backTrace()``).  Blocks
+	of rows are read into memory from the bottom of the matrix up, only as far 
+	across as the path can reach (from the start of the warp window lo, if it is 
+	given), so the file is read in long sequential runs.
+	'''
+	n, m = costMat.shape
+
+	i = n - 1
+	j = m - 1
+
+	path = np.empty((i + j + 1, 2), dtype=np.int32)
+	path[0,0] = i
+	path[0,1] = j
+	k = 1
+
+	backTraceCost = float(dist[i,j])
+	counters = np.zeros(5, dtype=np.int64)
+
+	while i > 0 or j > 0:
+		left0 = 0
+		if lo is not None:
+			left0 = lo[max(0, i - 1)]
+
+		rows = max(2, MAPPED_CELLS // (j + 1 - left0))
+		top = max(0, i - rows + 1)
+		if lo is not None:
+			left0 = lo[top]
+
+		costRows = np.ascontiguousarray(costMat[top:i + 1, left0:j + 1])
+		distRows = np.ascontiguousarray(dist[top:i + 1, left0:j + 1])
+
+		i, j, k, backTraceCost = _backTraceRows(costRows,distRows,top,left0,i,j,path,k,backTraceCost,counters)
+
+	return path[:k], backTraceCost, tuple(int(c) for c in counters)
+
+
+@jit
+def _backTraceRows(costRows,distRows,top,left0,i,j,path,k,backTraceCost,counters):
+	'''Compiled backtrace through a block of rows of the cost matrix, whose first
+	cell is (top, left0), from cell (i, j) until the path reaches the top row of 
+	the block (see ``_backTraceMapped()``).  The counters are updated in place.
+	'''
+	while i > top or (i == 0 and j > 0):
+		r = i - top
+		c = j - left0
+
+		if i==0:
+			# Edge condition (only one direction)
+			j = j - 1
+		elif j==0:
+			# Edge condition (only one direction)
+			i = i - 1
+		else:
+			# Cells left of the block are outside the warp window
+			diag = np.inf
+			left = np.inf
+			if c > 0:
+				diag = costRows[r-1,c-1]
+				left = costRows[r,c-1]
+
+			minMove = min(diag, costRows[r-1,c], left)
+			if costRows[r-1,c] == minMove:
+				i = i - 1
+			elif left == minMove:
+				j = j - 1
+			else:
+				i = i - 1
+				j = j - 1
+
+		backTraceCost += distRows[i - top,j - left0]
+		path[k,0] = i
+		path[k,1] = j
+		k += 1
+
+		if j > i:
+			counters[0] += 1
+			counters[3] += j - i
+		elif i > j:
+			counters[1] += 1
+			counters[4] += i - j
+		else:
+			counters[2] += 1
+
+	return i, j, k, backTraceCost
+
+
+def backTraceBand(dirBand,x,y,lo,hi,start,metric=_L1):
+	'''Finds the optimal warping path by following the direction codes recorded by
+	``warpBand()``.  The path is found in a single compiled pass, which also 
+	calculates the backtrace cost (recalculating the distances along the path)
+	and the warp statistics.
+
+	Parameters
+	----------
+		dirBand : numpy 1D-array
+			The backtrace direction codes of the cells in the band, in band storage
+			order
+		x : numpy 1D or 2D-array
+			First time series, which has been warped against time series y, with 
+			one row per time period and one column per channel
+		y : numpy 1D or 2D-array
+			Second time series (reference), with the same channels as x
+		lo, hi, start : numpy 1D-array
+			The warp band (see ``warpLimits()`` and ``bandOffsets()``)
+		metric : function
+			Compiled distance metric (default = L1) - see ``registerMetric()``
+
+	Returns
+	-------
+		path : numpy array
+			List of pairs of coordinates in time-space describing the backtrace through
+			the cost matrix
+		backTraceCost : float
+			The sum cost of following the backtrace through the cost matrix
+		warpStats : dict
+			Warp statistics object - see ``backTrace()``
+	'''
+	path, backTraceCost, counters = _backTraceDir(dirBand,x,y,lo,hi,start,metric)
+	warpStats = _warpStats(*counters)
+
+	return path, backTraceCost, warpStats
+
+
+@jit
+def _backTraceDir(dirBand,x,y,lo,hi,start,metric):
+	'''Compiled backtrace along the direction codes of a band (see 
+	``backTraceBand()``).
+	'''
+	timeAhead = 0
+	timeBehind = 0
+	timeSync = 0
+
+	amountAhead = 0
+	amountBehind = 0
+
+	i = len(lo) - 1
+	j = hi[i]
+
+	path = np.empty((i + j + 1, 2), dtype=np.int32)
+	path[0,0] = i
+	path[0,1] = j
+	k = 1
+
+	backTraceCost = metric(x,y,i,j)
+
+	while i>0 or j>0:
+		move = dirBand[start[i] + j - lo[i]]
+		if move == DIR_UP:
+			i = i - 1
+		elif move == DIR_LEFT:
+			j = j - 1
+		else:
+			i = i - 1
+			j = j - 1
+
+		backTraceCost += metric(x,y,i,j)
+		path[k,0] = i
+		path[k,1] = j
+		k += 1
+
+		if j > i:
+			timeAhead += 1
+			amountAhead += j - i
+		elif i > j:
+			timeBehind += 1
+			amountBehind += i - j
+		else:
+			timeSync +=1
+
+	counters = (timeAhead,timeBehind,timeSync,amountAhead,amountBehind)
+
+	return path[:k], backTraceCost, counters
+
+
+def warpLinear(x,y,lo,hi,erp=False,g=0,metric=_L1,dtype=np.float64,ub=np.inf,cells=None):
+	'''Calculates the DTW or ERP cost and the exact warping path between two time 
+	series, in memory proportional to the length of the series, by splitting the
+	cost matrix in two at its middle row (Hirschberg's method).  The path and warp
+	statistics are the same as ``backTraceBand()`` gives, including the choice 
+	between paths of equal cost.
+
+	The cost matrix is split recursively into blocks.  Passing down a block, 
+	each cell records the column at which its backtrace reaches the middle row,
+	so the block is divided into the part above the middle row (left of that 
+	column) and the part below it (right of that column), each with the costs 
+	along its top and left edge.  Only a few rows are kept for each pass, and 
+	blocks of fewer than ``LINEAR_CELLS`` cells are backtraced directly.  The 
+	cost matrix is calculated about three times over.
+
+	Parameters
+	----------
+		x : numpy 1D or 2D-array
+			First time series, which will be compared against time series y, with 
+			one row per time period and one column per channel
+		y : numpy 1D or 2D-array
+			Second time series (reference), with the same channels as x
+		lo, hi : numpy 1D-array
+			First and last column of the warp window in each row (see 
+			``warpLimits()``)
+		erp : bool
+			Calculate the ERP cost matrix instead of DTW (default = False)
+		g :	int
+			ERP g-value (deafult = 0)
+		metric : function
+			Compiled distance metric (default = L1) - see ``registerMetric()``
+		dtype : numpy dtype
+			Type of the cost matrix, ``np.float64`` or ``np.float32`` 
+			(default = np.float64)
+		ub : float
+			Upper bound on the cost.  The first pass over the cost matrix stops 
+			once every cell of a row costs more than this, and if the cost is 
+			higher, no path is found: the cost and backtrace cost are infinity, the 
+			path is empty and the warp statistics are None (default = infinity)
+		cells : numpy 1D-array
+			Optional 1-element array, which is set to the number of cells in the 
+			band (or those calculated before the first pass stopped at ub, 
+			default = None)
+
+	Returns
+	-------
+		cost : float
+			Bottom left value of the cost matrix
+		path : numpy array
+			List of pairs of coordinates in time-space describing the backtrace through
+			the cost matrix
+		backTraceCost : float
+			The sum cost of following the backtrace through the cost matrix
+		warpStats : dict
+			Warp statistics object - see ``backTrace()``
+	'''
+	n = len(x)
+	m = len(y)
+
+	# First and last column of the path in each row
+	rowStart = np.empty(n, dtype=np.int64)
+	rowEnd = np.empty(n, dtype=np.int64)
+
+	# Blocks still to be backtraced, as the rows and columns of the block and the
+	# costs of the row above it and of the column left of it.  The upper block
+	# is taken first, so the lower blocks waiting are side by side.
+	blocks = [(0, n - 1, 0, m - 1, np.full(m + 1, np.inf, dtype=dtype), np.full(n, np.inf, dtype=dtype))]
+	cost = None
+
+	# Rows calculated by the first pass, which may stop at the upper bound
+	rows = np.full(1, n, dtype=np.int64)
+
+	while len(blocks) > 0:
+		a, b, c0, c1, top, left = blocks.pop()
+
+		# Only the first pass (over the whole cost matrix) is checked against the
+		# upper bound
+		bound = np.inf
+		if cost is None:
+			bound = ub
+
+		if a == b or (b - a + 1) * (c1 - c0 + 1) <= LINEAR_CELLS:
+			end = _linearBase(x,y,lo,hi,a,b,c0,c1,top,left,erp,g,metric,rowStart,rowEnd,bound,rows)
+		else:
+			mid = (a + b) // 2
+			midRow, c, lastCol = _linearBlock(x,y,lo,hi,a,b,c0,c1,top,left,mid,erp,g,metric,bound,rows)
+			end = lastCol[-1]
+
+			if cost is None and not end <= ub:
+				blocks = []
+			else:
+				# Costs of the column left of the lower block
+				if c == c0:
+					lowerLeft = left[mid + 1 - a:]
+				else:
+					lowerLeft = _linearBlock(x,y,lo,hi,mid + 1,b,c0,c - 1,midRow[0:c - c0 + 1],left[mid + 1 - a:],b,erp,g,metric,np.inf,rows)[2]
+
+				blocks.append((mid + 1, b, c, c1, midRow[c - c0:], lowerLeft))
+				blocks.append((a, mid, c0, c, top[0:c - c0 + 2], left[0:mid - a + 1]))
+
+		if cost is None:
+			cost = end
+
+			if cells is not None:
+				cells[0] = _bandCells(lo,hi,rows[0])
+
+			if not cost <= ub:
+				return np.inf, np.empty((0,2), dtype=np.int32), np.inf, None
+
+	path, backTraceCost, counters = _runPath(rowStart,rowEnd,x,y,metric)
+	warpStats = _warpStats(*counters)
+
+	return cost, path, backTraceCost, warpStats
+
+
+@jit
+def _linearBlock(x,y,lo,hi,a,b,c0,c1,top,left,mid,erp,g,metric,ub,rows):
+	'''Calculates the costs of rows a to b and columns c0 to c1 of the cost matrix, 
+	from the costs of the row above (top, from column c0 - 1) and the column to 
+	the left (see ``warpLinear()``).
+
+	Returns the costs of row mid (from column c0 - 1), the column at which the 
+	backtrace from cell (b, c1) reaches row mid, and the costs of column c1.  If
+	every cell of a row costs more than ub, the calculation stops with the cost 
+	of cell (b, c1) set to infinity, and the number of rows calculated in rows.
+	'''
+	w = c1 - c0 + 1
+
+	prev = top.copy()
+	cur = np.empty(w + 1, dtype=top.dtype)
+	midRow = top.copy()
+	lastCol = np.empty(b - a + 1, dtype=top.dtype)
+
+	# Column at which the backtrace from each cell reaches row mid (-1 if it 
+	# leaves the block first)
+	prevLabel = np.full(w + 1, -1, dtype=np.int64)
+	label = np.full(w + 1, -1, dtype=np.int64)
+
+	gap = _gapPoint(x,g)
+
+	for i in range(a, b + 1):
+		cur[0] = left[i - a]
+
+		# Only the cells of the block inside the warp window are visited
+		jLo = max(c0, lo[i])
+		jHi = min(c1, hi[i])
+		if c0 < jLo <= c1:
+			cur[jLo - c0] = np.inf
+
+		for j in range(jLo, jHi + 1):
+			k = j - c0 + 1
+
+			d = metric(x,y,i,j)
+			cur[k] = _warpCell(x,y,i,j,d,prev[k-1],prev[k],cur[k-1],gap,erp,g,metric)
+
+			if i > mid:
+				move = _warpMove(i,j,prev[k-1],prev[k],cur[k-1])
+				if move == DIR_LEFT:
+					label[k] = label[k-1]
+				elif i - 1 == mid:
+					label[k] = j if move == DIR_UP else j - 1
+				else:
+					label[k] = prevLabel[k] if move == DIR_UP else prevLabel[k-1]
+
+		_linearEdges(lo,hi,i,b,c0,c1,jLo,jHi,cur)
+
+		lastCol[i - a] = cur[w] if lo[i] <= c1 <= hi[i] else np.inf
+
+		# Every path crosses this row, so the cost is higher than the bound
+		if ub < np.inf and jLo <= jHi and cur[jLo - c0 + 1:jHi - c0 + 2].min() > ub:
+			lastCol[b - a] = np.inf
+			rows[0] = i + 1
+			return midRow, -1, lastCol
+
+		if i == mid:
+			midRow[:] = cur
+
+		prev, cur = cur, prev
+		prevLabel, label = label, prevLabel
+
+	return midRow, prevLabel[w], lastCol
+
+
+@jit
+def _linearBase(x,y,lo,hi,a,b,c0,c1,top,left,erp,g,metric,rowStart,rowEnd,ub,rows):
+	'''Backtraces through a small block of the cost matrix (see 
+	``_linearBlock()``), from cell (b, c1) until the path leaves the top of the 
+	block, recording the first and last column of the path in each row.  Returns
+	the cost of cell (b, c1), or infinity without backtracing if every cell of 
+	a row costs more than ub.
+	'''
+	w = c1 - c0 + 1
+
+	prev = top.copy()
+	cur = np.empty(w + 1, dtype=top.dtype)
+	dirs = np.empty((b - a + 1, w), dtype=np.uint8)
+
+	gap = _gapPoint(x,g)
+
+	for i in range(a, b + 1):
+		cur[0] = left[i - a]
+
+		jLo = max(c0, lo[i])
+		jHi = min(c1, hi[i])
+		if c0 < jLo <= c1:
+			cur[jLo - c0] = np.inf
+
+		for j in range(jLo, jHi + 1):
+			k = j - c0 + 1
+
+			d = metric(x,y,i,j)
+			cur[k] = _warpCell(x,y,i,j,d,prev[k-1],prev[k],cur[k-1],gap,erp,g,metric)
+			dirs[i - a,k - 1] = _warpMove(i,j,prev[k-1],prev[k],cur[k-1])
+
+		_linearEdges(lo,hi,i,b,c0,c1,jLo,jHi,cur)
+
+		# Every path crosses this row, so the cost is higher than the bound
+		if ub < np.inf and jLo <= jHi and cur[jLo - c0 + 1:jHi - c0 + 2].min() > ub:
+			rows[0] = i + 1
+			return np.inf
+
+		prev, cur = cur, prev
+
+	i = b
+	j = c1
+	rowEnd[i] = j
+	while True:
+		rowStart[i] = j
+		if i == 0 and j == 0:
+			break
+
+		move = dirs[i - a,j - c0]
+		if move == DIR_UP:
+			i = i - 1
+		elif move == DIR_LEFT:
+			j = j - 1
+		else:
+			i = i - 1
+			j = j - 1
+
+		if i < a or j < c0:
+			break
+		if move != DIR_LEFT:
+			rowEnd[i] = j
+
+	return prev[w]
+
+
+@jit
+def _linearEdges(lo,hi,i,b,c0,c1,jLo,jHi,cur):
+	'''Sets the cells of row i of a block that the next row reads, but which are
+	outside of the warp window, to infinity (see ``_linearBlock()``).  As the 
+	window only moves right, this is a few cells at each edge of the window.
+	'''
+	if i == b:
+		return
+
+	for j in range(max(c0, lo[i+1] - 1), min(c1, hi[i+1]) + 1):
+		if j < jLo or j > jHi:
+			cur[j - c0 + 1] = np.inf
+
+
+@jit
+def _runPath(rowStart,rowEnd,x,y,metric):
+	'''Builds the warping path from the first and last column of the path in each
+	row, with the backtrace cost and counters as ``_backTraceDir()``.
+	'''
+	n = len(rowStart)
+
+	length = 0
+	for i in range(n):
+		length += rowEnd[i] - rowStart[i] + 1
+
+	path = np.empty((length, 2), dtype=np.int32)
+	k = 0
+	for i in range(n - 1, -1, -1):
+		for j in range(rowEnd[i], rowStart[i] - 1, -1):
+			path[k,0] = i
+			path[k,1] = j
+			k += 1
+
+	timeAhead = 0
+	timeBehind = 0
+	timeSync = 0
+
+	amountAhead = 0
+	amountBehind = 0
+
+	backTraceCost = metric(x,y,path[0,0],path[0,1])
+
+	for k in range(1, length):
+		i = path[k,0]
+		j = path[k,1]
+		backTraceCost += metric(x,y,i,j)
 
 		if j > i:
 			timeAhead += 1
@@ -388,6 +2770,14 @@ def backTrace(costMat,dist):
 		else:
 			timeSync +=1
 
+	counters = (timeAhead,timeBehind,timeSync,amountAhead,amountBehind)
+
+	return path, backTraceCost, counters
+
+
+def _warpStats(timeAhead,timeBehind,timeSync,amountAhead,amountBehind):
+	'''Builds the warp statistics object from the backtrace counters.
+	'''
 	warpStats = {}
 	warpStats["timeAhead"] = timeAhead
 	warpStats["timeBehind"] = timeBehind
@@ -403,7 +2793,8 @@ def backTrace(costMat,dist):
 	if timeBehind > 0:
 		warpStats["avgBehind"] = amountBehind / timeBehind
 
-	warpStats["avgWarp"] = (amountBehind - amountAhead) / (timeAhead + timeBehind + timeSync)
-
-	return path, backTraceCost, warpStats
+	warpStats["avgWarp"] = 0
+	if timeAhead + timeBehind + timeSync > 0:
+		warpStats["avgWarp"] = (amountBehind - amountAhead) / (timeAhead + timeBehind + timeSync)
 
+	return warpStats
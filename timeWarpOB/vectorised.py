@@ -0,0 +1,496 @@
+# Vectorised numpy versions of the compiled functions, used in their place when
+# numba is not installed (or TIMEWARPOB_BACKEND=numpy is set).  Each function
+# has the same name, parameters and results as the function it replaces, so the
+# rest of timeWarpOB works unchanged.
+#
+# The DTW and ERP cost matrices are calculated one anti-diagonal at a time (a
+# wavefront), as every cell on an anti-diagonal depends only on the two
+# anti-diagonals before it.
+
+# Using numpy for matrix manipulations
+import numpy as np
+
+# The main module imports this module while it is loading, so its names are 
+# only looked up when the functions are used
+from . import timeWarpOB as _core
+
+
+def _difference(x,y,i,j):
+	'''Differences between periods i of x and periods j of y.  Integer samples 
+	are widened as they are subtracted, so small integer types do not overflow.
+	'''
+	xi = x[i]
+	yj = y[j]
+	if xi.dtype.kind in 'iu':
+		xi = xi.astype(np.int64)
+	if yj.dtype.kind in 'iu':
+		yj = yj.astype(np.int64)
+
+	return xi - yj
+
+
+def _L1(x,y,i,j):
+	'''L1 distance between periods i of x and periods j of y, summed over
+	channels.  i and j may be arrays of indices.
+	'''
+	if x.ndim == 1:
+		return np.abs(_difference(x,y,i,j))
+
+	return np.abs(_difference(x,y,i,j)).sum(axis=-1)
+
+
+def _L2(x,y,i,j):
+	'''Euclidean (L2) distance between periods i of x and periods j of y.
+	'''
+	return np.sqrt(_sqEuclidean(x,y,i,j))
+
+
+def _sqEuclidean(x,y,i,j):
+	'''Squared Euclidean distance between periods i of x and periods j of y.
+	'''
+	if x.ndim == 1:
+		return _difference(x,y,i,j) ** 2
+
+	return (_difference(x,y,i,j) ** 2).sum(axis=-1)
+
+
+def _chebyshev(x,y,i,j):
+	'''Chebyshev distance (largest distance of any channel) between periods i of
+	x and periods j of y.
+	'''
+	if x.ndim == 1:
+		return np.abs(_difference(x,y,i,j))
+
+	return np.abs(_difference(x,y,i,j)).max(axis=-1)
+
+
+def _distMatrix(a,b,metric,dtype=np.float64):
+	'''Distance matrix between two time series, by broadcasting the metric over
+	blocks of rows.
+	'''
+	n = len(a)
+	m = len(b)
+
+	distance = np.empty((n,m), dtype=dtype)
+	cols = np.arange(m)[None,:]
+
+	# Keep the broadcast differences to around a million values at a time
+	channels = 1
+	if a.ndim == 2:
+		channels = a.shape[1]
+	rows = max(1, 2 ** 20 // max(1, m * channels))
+
+	for i in range(0, n, rows):
+		block = np.arange(i, min(n, i + rows))[:,None]
+		distance[i:i + rows] = metric(a,b,block,cols)
+
+	return distance
+
+
+def _diagonalRows(lo,hi,diagonals):
+	'''First and last row of the band on each anti-diagonal (cells (i, j) with
+	i + j = s).  As lo and hi never decrease, the rows of the band on each
+	anti-diagonal are a single run.
+	'''
+	rows = np.arange(len(lo))
+	s = np.arange(diagonals)
+
+	first = np.searchsorted(rows + hi, s, side='left')
+	last = np.searchsorted(rows + lo, s, side='right') - 1
+
+	return first, last
+
+
+def _wavefront(lo,hi,start,m,dist,gapX,gapY,erp,g,costBand,dirBand,dtype,top=None,offset=0,ub=np.inf,cells=None):
+	'''Calculates the DTW or ERP cost over a band, one anti-diagonal at a time.
+	dist(i, j) gives the distances of the cells (i, j) for arrays of indices, and
+	gapX and gapY the ERP gap distance of each period.  The costs and backtrace
+	directions are written into costBand and dirBand if they are not None, and
+	the costs are rounded to dtype as they are calculated.
+
+	The band may be a strip of rows starting at row offset of the cost matrix, 
+	with top holding the costs of the row above the strip.
+
+	Every path crosses one of any two neighbouring anti-diagonals, so the 
+	calculation stops (returning infinity) once both cost more than ub.  The 
+	number of cells calculated is written into cells if it is not None.
+	'''
+	n = len(lo)
+
+	first, last = _diagonalRows(lo,hi,n + m - 1)
+
+	# The last three anti-diagonals, stored by row + 1 so that row -1 (before
+	# the first row) is always outside of the band
+	diagonals = np.full((3, n + 1), np.inf, dtype=dtype)
+	prevMin = np.inf
+
+	for s in range(n + m - 1):
+		cur = diagonals[s % 3]
+		prev = diagonals[(s - 1) % 3]
+		prev2 = diagonals[(s - 2) % 3]
+
+		# The row above a strip is stored at row -1
+		if top is not None:
+			prev[0] = top[s] if s < m else np.inf
+
+		# Clear the anti-diagonal this one replaces
+		if s >= 3 and first[s-3] <= last[s-3]:
+			cur[first[s-3] + 1:last[s-3] + 2] = np.inf
+
+		if first[s] > last[s]:
+			continue
+
+		i = np.arange(first[s], last[s] + 1)
+		j = s - i
+		d = dist(i,j)
+
+		# Cells outside the window cost infinity
+		diag = prev2[i]
+		up = prev[i]
+		left = prev[i + 1]
+
+		if s == 0 and offset == 0:
+			c = d
+		elif erp:
+			c = np.minimum(np.minimum(diag + d, up + gapX[i]), left + gapY[j])
+
+			# Edges are a running sum of the penalised distance
+			edge = (i + offset == 0) | (j == 0)
+			c[edge] = np.minimum(up[edge], left[edge]) + np.abs(d[edge] - g)
+		else:
+			c = np.minimum(np.minimum(diag, up), left) + d
+
+		cur[i + 1] = c
+
+		if ub < np.inf:
+			cMin = c.min()
+			if cMin > ub and prevMin > ub:
+				if cells is not None:
+					cells[0] = np.maximum(last[0:s + 1] - first[0:s + 1] + 1, 0).sum()
+				return np.inf
+			prevMin = cMin
+
+		k = start[i] + j - lo[i]
+		if costBand is not None:
+			costBand[k] = c
+
+		if dirBand is not None:
+			# Step that the backtrace will take out of each cell
+			minMove = np.minimum(np.minimum(diag, up), left)
+			move = np.where(up == minMove, _core.DIR_UP,
+				np.where(left == minMove, _core.DIR_LEFT, _core.DIR_DIAG))
+			move[i + offset == 0] = _core.DIR_LEFT
+			move[j == 0] = _core.DIR_UP
+			if s == 0 and offset == 0:
+				move[0] = _core.DIR_START
+
+			dirBand[k] = move
+
+	if cells is not None:
+		cells[0] = start[n]
+
+	if lo[n-1] <= m - 1 <= hi[n-1]:
+		return diagonals[(n + m - 2) % 3][n]
+
+	return np.inf
+
+
+def _gapDistances(x,y,g,metric):
+	'''ERP gap distance of each period of x and y.
+	'''
+	gap = _core._gapPoint(x,g)
+
+	return metric(x,gap,np.arange(len(x)),0), metric(y,gap,np.arange(len(y)),0)
+
+
+def warpBand(x,y,lo,hi,start,erp=False,g=0,retCost=True,metric=_L1,dtype=np.float64,ub=np.inf,cells=None):
+	'''Vectorised version of ``timeWarpOB.warpBand()``.  Only the cost band is
+	returned if ``retCost = True`` (an empty array otherwise).
+	'''
+	n = len(x)
+
+	costBand = np.empty(0, dtype=dtype)
+	if retCost:
+		costBand = np.empty(start[n], dtype=dtype)
+	dirBand = np.empty(start[n], dtype=np.uint8)
+
+	gapX, gapY = _gapDistances(x,y,g,metric)
+	dist = lambda i, j: metric(x,y,i,j)
+
+	cost = _wavefront(lo,hi,start,len(y),dist,gapX,gapY,erp,g,costBand if retCost else None,dirBand,dtype,ub=ub,cells=cells)
+
+	return cost, costBand, dirBand
+
+
+def warpCost(x,y,lo,hi,erp=False,g=0,metric=_L1,dtype=np.float64,ub=np.inf,cells=None):
+	'''Vectorised version of ``timeWarpOB.warpCost()``.  Three anti-diagonals of
+	the cost matrix are kept, so memory use is proportional to the length of the
+	series.
+	'''
+	start = _core.bandOffsets(lo,hi)
+
+	gapX, gapY = _gapDistances(x,y,g,metric)
+	dist = lambda i, j: metric(x,y,i,j)
+
+	return _wavefront(lo,hi,start,len(y),dist,gapX,gapY,erp,g,None,None,dtype,ub=ub,cells=cells)
+
+
+def warpTiled(x,y,lo,hi,start,erp=False,g=0,retCost=True,retDir=True,metric=_L1,tile=256,dtype=np.float64,ub=np.inf,cells=None):
+	'''Vectorised version of ``timeWarpOB.warpTiled()``.  The cells of each
+	anti-diagonal are already calculated together, so tiles are not used.
+	'''
+	if not retDir:
+		costBand = np.empty(0, dtype=dtype)
+		if retCost:
+			cost, costBand, dirBand = warpBand(x,y,lo,hi,start,erp,g,True,metric,dtype,ub,cells)
+		else:
+			cost = warpCost(x,y,lo,hi,erp,g,metric,dtype,ub,cells)
+
+		return cost, costBand, np.empty(0, dtype=np.uint8)
+
+	cost, costBand, dirBand = warpBand(x,y,lo,hi,start,erp,g,retCost,metric,dtype,ub,cells)
+
+	return cost, costBand, dirBand
+
+
+def warpRows(x,y,lo,hi,costMat,distMat,erp=False,g=0,metric=_L1,ub=np.inf,cells=None):
+	'''Vectorised version of ``timeWarpOB.warpRows()``.  The matrices are filled 
+	in strips of rows, each strip one anti-diagonal at a time, and the last row 
+	of each strip is checked against ub.
+	'''
+	n = len(x)
+	m = len(y)
+
+	gapX, gapY = _gapDistances(x,y,g,metric)
+	cols = np.arange(m)[None,:]
+	rows = max(1, _core.MAPPED_CELLS // m)
+
+	top = None
+	for r0 in range(0, n, rows):
+		r1 = min(n, r0 + rows)
+		dist = metric(x,y,np.arange(r0, r1)[:,None],cols)
+		distMat[r0:r1] = dist
+
+		stripLo = lo[r0:r1]
+		stripHi = hi[r0:r1]
+		start = _core.bandOffsets(stripLo,stripHi)
+
+		costBand = np.empty(start[-1], dtype=costMat.dtype)
+		_wavefront(stripLo,stripHi,start,m,lambda i, j: dist[i,j],gapX[r0:r1],gapY,erp,g,
+			costBand,None,costMat.dtype,top,r0)
+
+		strip = _core.bandToDense(costBand,stripLo,stripHi,start,m)
+		costMat[r0:r1] = strip
+		top = strip[-1]
+
+		# Every path crosses the last row of the strip
+		if ub < np.inf and top[lo[r1-1]:hi[r1-1] + 1].min() > ub:
+			if cells is not None:
+				cells[0] = (hi[0:r1] - lo[0:r1] + 1).sum()
+			return np.inf
+
+	if cells is not None:
+		cells[0] = (hi - lo + 1).sum()
+
+	return top[m-1]
+
+
+def _denseWarp(dist,x,y,w,erp,g,dtype,ub=np.inf):
+	'''Dense DTW or ERP cost matrix from a distance matrix (see ``DTWwarp()`` and
+	``ERPwarp()``).
+	'''
+	dist = np.asarray(dist)
+	n = len(x)
+	m = len(y)
+
+	lo, hi = _core.warpLimits(n,m,w)
+	start = _core.bandOffsets(lo,hi)
+
+	gapX = np.zeros(n)
+	gapY = np.zeros(m)
+	if erp:
+		gapX = np.abs(np.asarray(x, dtype=np.float64) - g)
+		gapY = np.abs(np.asarray(y, dtype=np.float64) - g)
+
+	# Cells after the calculation stops at the upper bound are left as infinity
+	costBand = np.full(start[n], np.inf, dtype=dtype)
+	_wavefront(lo,hi,start,m,lambda i, j: dist[i,j],gapX,gapY,erp,g,costBand,None,dtype,ub=ub)
+
+	return _core.bandToDense(costBand,lo,hi,start,m)
+
+
+def ERPwarp(dist,x,y,w=0,g=0,dtype=np.float64,ub=np.inf):
+	'''Vectorised version of ``timeWarpOB.ERPwarp()``.  With ``ub``, the 
+	calculation stops on an anti-diagonal rather than a row.
+	'''
+	return _denseWarp(dist,x,y,w,True,g,dtype,ub)
+
+
+def DTWwarp(dist,x,y,w=0,dtype=np.float64,ub=np.inf):
+	'''Vectorised version of ``timeWarpOB.DTWwarp()``.  With ``ub``, the 
+	calculation stops on an anti-diagonal rather than a row.
+	'''
+	return _denseWarp(dist,x,y,w,False,0,dtype,ub)
+
+
+def _followDirections(dirBand,lo,hi,start):
+	'''Follows the direction codes of a band from the last cell back to (0, 0).
+	Runs of left steps along a row are found for every cell at once, so only one
+	step per row is taken in python.
+	'''
+	n = len(lo)
+
+	# The cell each run of left steps ends at (the first cell of every row is
+	# never a left step)
+	cells = np.arange(len(dirBand))
+	stop = np.maximum.accumulate(np.where(dirBand != _core.DIR_LEFT, cells, 0))
+
+	rows = []
+	enter = []
+	leave = []
+
+	i = n - 1
+	j = hi[i]
+	while True:
+		k = stop[start[i] + j - lo[i]]
+		jStop = lo[i] + k - start[i]
+
+		rows.append(i)
+		enter.append(j)
+		leave.append(jStop)
+
+		move = dirBand[k]
+		if move == _core.DIR_UP:
+			i = i - 1
+			j = jStop
+		elif move == _core.DIR_DIAG:
+			i = i - 1
+			j = jStop - 1
+		else:
+			break
+
+	# Each row of the path runs from the entry column left to the exit column
+	rows = np.array(rows, dtype=np.int64)
+	enter = np.array(enter, dtype=np.int64)
+	leave = np.array(leave, dtype=np.int64)
+
+	counts = enter - leave + 1
+	steps = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+	path = np.empty((counts.sum(), 2), dtype=np.int32)
+	path[:,0] = np.repeat(rows, counts)
+	path[:,1] = np.repeat(enter, counts) - steps
+
+	return path
+
+
+def _pathCounters(path,d):
+	'''Backtrace cost and warp statistics counters of a path, given the distance
+	of each cell on it.  The distances are added in the same order as the
+	compiled backtrace.
+	'''
+	backTraceCost = np.add.accumulate(d)[-1]
+
+	ahead = path[1:,1].astype(np.int64) - path[1:,0]
+
+	timeAhead = int(np.count_nonzero(ahead > 0))
+	timeBehind = int(np.count_nonzero(ahead < 0))
+	timeSync = int(np.count_nonzero(ahead == 0))
+	amountAhead = int(ahead[ahead > 0].sum())
+	amountBehind = int(-ahead[ahead < 0].sum())
+
+	counters = (timeAhead,timeBehind,timeSync,amountAhead,amountBehind)
+
+	return backTraceCost, counters
+
+
+def _backTraceDir(dirBand,x,y,lo,hi,start,metric):
+	'''Vectorised version of ``timeWarpOB._backTraceDir()``.
+	'''
+	path = _followDirections(dirBand,lo,hi,start)
+	d = np.asarray(metric(x,y,path[:,0],path[:,1]), dtype=np.float64)
+
+	backTraceCost, counters = _pathCounters(path,d)
+
+	return path, backTraceCost, counters
+
+
+def _backTraceMat(costMat,dist):
+	'''Vectorised version of ``timeWarpOB._backTraceMat()``.  The backtrace
+	directions of every cell are found from the cost matrix first.
+	'''
+	n, m = costMat.shape
+
+	diag = np.full((n,m), np.inf)
+	up = np.full((n,m), np.inf)
+	left = np.full((n,m), np.inf)
+	diag[1:,1:] = costMat[:-1,:-1]
+	up[1:,:] = costMat[:-1,:]
+	left[:,1:] = costMat[:,:-1]
+
+	minMove = np.minimum(np.minimum(diag, up), left)
+	dirMat = np.where(up == minMove, _core.DIR_UP,
+		np.where(left == minMove, _core.DIR_LEFT, _core.DIR_DIAG)).astype(np.uint8)
+	dirMat[0,:] = _core.DIR_LEFT
+	dirMat[:,0] = _core.DIR_UP
+	dirMat[0,0] = _core.DIR_START
+
+	lo, hi = _core.warpLimits(n,m,0)
+	start = _core.bandOffsets(lo,hi)
+
+	path = _followDirections(dirMat.ravel(),lo,hi,start)
+	backTraceCost, counters = _pathCounters(path,dist[path[:,0],path[:,1]])
+
+	return path, backTraceCost, counters
+
+
+def _projectPath(path,n,m,radius):
+	'''Vectorised version of ``timeWarpOB._projectPath()``.  As the path never
+	goes back, the columns it covers never decrease from one row to the next, so
+	the widest columns within radius rows are at the ends of the radius.
+	'''
+	pathLo = np.full(n, m, dtype=np.int64)
+	pathHi = np.full(n, -1, dtype=np.int64)
+
+	for r in range(2):
+		rows = 2 * path[:,0].astype(np.int64) + r
+		inside = rows < n
+		np.minimum.at(pathLo, rows[inside], 2 * path[inside,1].astype(np.int64))
+		np.maximum.at(pathHi, rows[inside], np.minimum(2 * path[inside,1].astype(np.int64) + 1, m - 1))
+
+	rows = np.arange(n)
+	lo = np.maximum(0, pathLo[np.maximum(0, rows - radius)] - radius)
+	hi = np.minimum(m - 1, pathHi[np.minimum(n - 1, rows + radius)] + radius)
+
+	return lo, hi
+
+
+def keoghEnvelope(c,w=0):
+	'''Vectorised version of ``timeWarpOB.search.keoghEnvelope()``, taking the
+	maximum and minimum over a sliding window.
+	'''
+	c = np.asarray(c, dtype=np.float64)
+	n = len(c)
+
+	if n == 0:
+		return np.empty(0), np.empty(0)
+
+	if w == 0 or w - 1 >= n:
+		return np.full(n, c.max()), np.full(n, c.min())
+
+	reach = w - 1
+	window = 2 * reach + 1
+
+	padded = np.concatenate((np.full(reach, -np.inf), c, np.full(reach, -np.inf)))
+	upper = np.lib.stride_tricks.sliding_window_view(padded, window).max(axis=1)
+
+	padded = np.concatenate((np.full(reach, np.inf), c, np.full(reach, np.inf)))
+	lower = np.lib.stride_tricks.sliding_window_view(padded, window).min(axis=1)
+
+	return upper, lower
+
+
+def lbKeogh(query,upper,lower):
+	'''Vectorised version of ``timeWarpOB.search.lbKeogh()``.
+	'''
+	return float(np.sum(np.maximum(query - upper, 0) + np.maximum(lower - query, 0)))